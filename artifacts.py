@@ -0,0 +1,96 @@
+import io
+import os
+import shutil
+import tempfile
+import uuid
+import numpy as np
+from PIL import Image
+
+# Keep up to this many bytes of decoded artifacts in memory per job
+DEFAULT_MEMORY_LIMIT = 512 * 1024 * 1024
+
+def default_spill_root():
+    """Prefer tmpfs for spilled artifacts, falling back to the system temp dir"""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+class ArtifactStore:
+    """
+    Holds the chunk images and audio of a single job in memory so they can be
+    handed straight to the compositor. Once the memory limit is reached, new
+    artifacts spill to a private per-job directory instead.
+    """
+    def __init__(self, job_id=None, memory_limit=DEFAULT_MEMORY_LIMIT, spill_root=None):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.memory_limit = memory_limit
+        self.memory_used = 0
+        self.spill_root = spill_root or default_spill_root()
+        self.job_dir = None
+        self._images = {}
+        self._audio = {}
+
+    def get_job_dir(self):
+        """Create the per-job directory on first use"""
+        if self.job_dir is None:
+            self.job_dir = tempfile.mkdtemp(prefix=f"reddit-tiktok-{self.job_id}-", dir=self.spill_root)
+        return self.job_dir
+
+    def path_for(self, name):
+        """Return a path inside the job directory for artifacts that must live on disk"""
+        return os.path.join(self.get_job_dir(), name)
+
+    def _fits_in_memory(self, size):
+        return self.memory_used + size <= self.memory_limit
+
+    def _spill(self, name, data):
+        path = self.path_for(name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _discard(self, entries, key):
+        """Forget an artifact that is about to be replaced, so its memory is not counted twice"""
+        old = entries.pop(key, None)
+        if isinstance(old, str):
+            if os.path.exists(old):
+                os.remove(old)
+        elif old is not None:
+            self.memory_used -= old.nbytes if isinstance(old, np.ndarray) else len(old)
+
+    def put_image(self, key, png_bytes):
+        """Store an encoded PNG as a decoded RGBA array, or spill it to disk"""
+        image = np.asarray(Image.open(io.BytesIO(png_bytes)).convert('RGBA'))
+        # Series mode re-renders a part's first card under the same key
+        self._discard(self._images, key)
+        if self._fits_in_memory(image.nbytes):
+            self._images[key] = image
+            self.memory_used += image.nbytes
+        else:
+            self._images[key] = self._spill(f"{key}.png", png_bytes)
+
+    def get_image(self, key):
+        """Return an RGBA array, or a file path if the image was spilled"""
+        return self._images[key]
+
+    def put_audio(self, key, audio_bytes):
+        """Store encoded audio bytes, or spill them to disk"""
+        self._discard(self._audio, key)
+        if self._fits_in_memory(len(audio_bytes)):
+            self._audio[key] = audio_bytes
+            self.memory_used += len(audio_bytes)
+        else:
+            self._audio[key] = self._spill(f"{key}.mp3", audio_bytes)
+
+    def get_audio(self, key):
+        """Return encoded audio bytes, or a file path if the audio was spilled"""
+        return self._audio[key]
+
+    def cleanup(self):
+        """Drop all artifacts and remove the job directory"""
+        self._images.clear()
+        self._audio.clear()
+        self.memory_used = 0
+        if self.job_dir and os.path.exists(self.job_dir):
+            shutil.rmtree(self.job_dir, ignore_errors=True)
+        self.job_dir = None
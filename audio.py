@@ -0,0 +1,134 @@
+import subprocess
+import wave
+import numpy as np
+
+# gTTS produces 24 kHz mono MP3s, so we keep narration at that rate
+NARRATION_SAMPLE_RATE = 24000
+# Windows quieter than this are treated as silence
+SILENCE_THRESHOLD_DB = -40.0
+RMS_WINDOW_MS = 20
+# Target loudness for the whole narration, with a ceiling on peaks
+TARGET_LOUDNESS_DB = -20.0
+PEAK_CEILING_DB = -1.0
+
+def get_ffmpeg_binary():
+    """Return the ffmpeg binary that MoviePy is configured to use"""
+    # Imported here so the pure NumPy helpers below load without MoviePy
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+def decode_audio(source, sample_rate=NARRATION_SAMPLE_RATE):
+    """Decode an audio file path or in-memory encoded bytes into mono float32 PCM samples"""
+    in_memory = isinstance(source, (bytes, bytearray))
+    cmd = [
+        get_ffmpeg_binary(), '-v', 'error',
+        '-i', 'pipe:0' if in_memory else source,
+        '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate),
+        '-'
+    ]
+    result = subprocess.run(
+        cmd,
+        input=bytes(source) if in_memory else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def window_rms(samples, sample_rate=NARRATION_SAMPLE_RATE, window_ms=RMS_WINDOW_MS):
+    """Return the RMS level of consecutive fixed-size windows and the window length"""
+    window = max(1, int(sample_rate * window_ms / 1000))
+    n_windows = len(samples) // window
+    frames = samples[:n_windows * window].astype(np.float64).reshape(n_windows, window)
+    return np.sqrt(np.mean(frames ** 2, axis=1)), window
+
+def trim_silence(samples, keep_gap=0.15, sample_rate=NARRATION_SAMPLE_RATE, threshold_db=SILENCE_THRESHOLD_DB):
+    """Trim leading and trailing silence, keeping half of keep_gap on each edge"""
+    rms, window = window_rms(samples, sample_rate)
+    voiced = np.flatnonzero(rms > 10 ** (threshold_db / 20))
+    pad = int(sample_rate * keep_gap / 2)
+    if len(voiced) == 0:
+        # Nothing audible, keep just the gap so chunk timing stays sane
+        return samples[:2 * pad]
+    start = max(0, voiced[0] * window - pad)
+    end = min(len(samples), (voiced[-1] + 1) * window + pad)
+    return samples[start:end]
+
+def normalize_loudness(samples, target_db=TARGET_LOUDNESS_DB, peak_db=PEAK_CEILING_DB, sample_rate=NARRATION_SAMPLE_RATE):
+    """Apply a single gain so the gated RMS loudness hits target_db without clipping peaks"""
+    rms, _ = window_rms(samples, sample_rate)
+    gated = rms[rms > 10 ** (SILENCE_THRESHOLD_DB / 20)]
+    if len(gated) == 0:
+        return samples
+    loudness = np.sqrt(np.mean(gated ** 2))
+    gain = 10 ** (target_db / 20) / loudness
+    peak = np.max(np.abs(samples))
+    if peak > 0:
+        gain = min(gain, 10 ** (peak_db / 20) / peak)
+    return (samples * gain).astype(np.float32)
+
+def atempo_filter(speed_factor):
+    """Build an atempo filter chain, since each atempo stage only accepts 0.5-2.0"""
+    stages = []
+    remaining = speed_factor
+    while remaining > 2.0:
+        stages.append(2.0)
+        remaining /= 2.0
+    while remaining < 0.5:
+        stages.append(0.5)
+        remaining /= 0.5
+    stages.append(remaining)
+    return ','.join(f"atempo={stage:.6f}" for stage in stages)
+
+def time_stretch(samples, speed_factor, sample_rate=NARRATION_SAMPLE_RATE):
+    """Speed up PCM samples without changing their pitch"""
+    if speed_factor == 1.0:
+        return samples
+    cmd = [
+        get_ffmpeg_binary(), '-v', 'error',
+        '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), '-i', '-',
+        '-af', atempo_filter(speed_factor),
+        '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate),
+        '-'
+    ]
+    result = subprocess.run(
+        cmd,
+        input=samples.astype(np.float32).tobytes(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def write_wav(samples, output_path, sample_rate=NARRATION_SAMPLE_RATE):
+    """Write float PCM samples to a 16-bit mono WAV file"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(output_path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+
+def build_narration(audio_sources, output_path, speed_factor=1.3, gap=0.15, sample_rate=NARRATION_SAMPLE_RATE):
+    """
+    Concatenate all chunk audio (paths or encoded bytes) into one narration track, trim silence between
+    chunks down to gap seconds, normalize loudness and time-stretch it once.
+    Returns the (start, end) time of every chunk in the final track and the
+    number of seconds the trimming saved.
+    """
+    decoded = [decode_audio(source, sample_rate) for source in audio_sources]
+    original_samples = sum(len(samples) for samples in decoded)
+    decoded = [trim_silence(samples, gap, sample_rate) for samples in decoded]
+    lengths = [len(samples) for samples in decoded]
+    narration = np.concatenate(decoded) if decoded else np.zeros(0, dtype=np.float32)
+    narration = normalize_loudness(narration, sample_rate=sample_rate)
+    seconds_saved = (original_samples - len(narration)) / sample_rate / speed_factor
+
+    stretched = time_stretch(narration, speed_factor, sample_rate)
+    write_wav(stretched, output_path, sample_rate)
+
+    # Map chunk edges onto the stretched timeline using the actual output length
+    ratio = len(stretched) / len(narration) if len(narration) else 1.0
+    edges = np.cumsum([0] + lengths) * ratio / sample_rate
+    chunk_times = [(float(start), float(end)) for start, end in zip(edges[:-1], edges[1:])]
+    return chunk_times, seconds_saved
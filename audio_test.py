@@ -0,0 +1,102 @@
+import os
+import tempfile
+import wave
+
+import numpy as np
+
+import audio
+from audio import atempo_filter, build_narration, trim_silence, normalize_loudness, NARRATION_SAMPLE_RATE
+
+RATE = NARRATION_SAMPLE_RATE
+
+def tone(seconds, amplitude=0.3, frequency=220):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+def rms_db(samples):
+    return 20 * np.log10(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
+
+def test_trim_leaves_half_the_gap_on_each_side():
+    samples = np.concatenate([silence(1.0), tone(0.5), silence(2.0)])
+    trimmed = trim_silence(samples, keep_gap=0.2)
+    # 0.5 s of speech plus 0.1 s each side, to within one 20 ms RMS window
+    assert abs(len(trimmed) / RATE - 0.7) <= 0.02
+    first_voiced = np.flatnonzero(np.abs(trimmed) > 1e-3)[0]
+    assert abs(first_voiced / RATE - 0.1) <= 0.02
+
+def test_trim_keeps_only_the_gap_of_a_silent_chunk():
+    assert len(trim_silence(silence(3.0), keep_gap=0.2)) == int(0.2 * RATE)
+
+def test_loudness_is_normalized_to_the_target():
+    normalized = normalize_loudness(tone(2.0, amplitude=0.05))
+    assert abs(rms_db(normalized) - audio.TARGET_LOUDNESS_DB) < 0.1
+
+def test_peaks_stay_under_the_ceiling():
+    samples = tone(2.0, amplitude=0.02)
+    samples[RATE] = 0.9
+    normalized = normalize_loudness(samples)
+    ceiling = 10 ** (audio.PEAK_CEILING_DB / 20)
+    assert np.max(np.abs(normalized)) <= ceiling + 1e-6
+    # The spike, not the loudness target, set the gain
+    assert rms_db(normalized) < audio.TARGET_LOUDNESS_DB
+    assert np.array_equal(normalize_loudness(silence(1.0)), silence(1.0))
+
+def atempo_stages(chain):
+    return [float(stage.split("=")[1]) for stage in chain.split(",")]
+
+def test_atempo_chain_covers_any_factor():
+    assert atempo_filter(1.3) == "atempo=1.300000"
+    assert atempo_stages(atempo_filter(3.0)) == [2.0, 1.5]
+    assert atempo_stages(atempo_filter(0.3)) == [0.5, 0.6]
+    for factor in (0.2, 0.26, 0.5, 2.0, 4.5, 8.0):
+        stages = atempo_stages(atempo_filter(factor))
+        # ffmpeg rejects a single atempo outside 0.5-2.0
+        assert all(0.5 <= stage <= 2.0 for stage in stages)
+        assert abs(np.prod(stages) - factor) < 1e-5
+
+def fake_stretch(samples, speed_factor, sample_rate=RATE):
+    """Stand-in for ffmpeg's atempo, which never lands on exactly len / speed_factor samples"""
+    length = int(len(samples) / speed_factor) + 37
+    return np.interp(np.linspace(0, len(samples) - 1, length), np.arange(len(samples)), samples).astype(np.float32)
+
+def test_chunk_times_add_up_to_the_stretched_track():
+    chunks = [
+        np.concatenate([np.zeros(RATE // 2, np.float32), tone(1.0), np.zeros(RATE // 2, np.float32)]),
+        tone(2.0),
+        np.concatenate([tone(0.5), np.zeros(RATE, np.float32)])
+    ]
+    decode, stretch = audio.decode_audio, audio.time_stretch
+    # Chunks are handed over already decoded, and the stretch is simulated, so no ffmpeg is needed
+    audio.decode_audio = lambda source, sample_rate=RATE: source
+    audio.time_stretch = fake_stretch
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "narration.wav")
+            chunk_times, seconds_saved = build_narration(chunks, output_path, speed_factor=1.3, gap=0.15)
+            with wave.open(output_path, 'rb') as wav_file:
+                track_seconds = wav_file.getnframes() / wav_file.getframerate()
+    finally:
+        audio.decode_audio, audio.time_stretch = decode, stretch
+
+    assert len(chunk_times) == 3
+    assert chunk_times[0][0] == 0.0
+    for (_, end), (start, _) in zip(chunk_times, chunk_times[1:]):
+        assert start == end
+    assert abs(chunk_times[-1][1] - track_seconds) < 1e-6
+    # Each chunk keeps its share of the track: trimmed to 1.15 s, 2.0 s and 0.575 s before the stretch
+    durations = [end - start for start, end in chunk_times]
+    expected = np.array([1.15, 2.0, 0.575]) * track_seconds / 3.725
+    assert np.allclose(durations, expected, atol=1e-3)
+    assert seconds_saved > 0
+
+if __name__ == "__main__":
+    test_trim_leaves_half_the_gap_on_each_side()
+    test_trim_keeps_only_the_gap_of_a_silent_chunk()
+    test_loudness_is_normalized_to_the_target()
+    test_peaks_stay_under_the_ceiling()
+    test_atempo_chain_covers_any_factor()
+    test_chunk_times_add_up_to_the_stretched_track()
+    print("All audio tests passed")
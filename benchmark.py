@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+from moviepy.editor import AudioFileClip, concatenate_videoclips
+
+from main import (
+    split_content_into_chunks, capture_reddit_post, create_video_clips, CardRenderer,
+    estimate_narration_duration, SPEED_FACTOR, NARRATION_GAP
+)
+from audio import build_narration, get_ffmpeg_binary, NARRATION_SAMPLE_RATE
+from artifacts import ArtifactStore
+
+FIXTURE_PATH = os.path.join("fixtures", "nosleep_hot.json")
+ASSETS_DIR = "bench_assets"
+BASELINE_PATH = "benchmark_baseline.json"
+RESULTS_PATH = "benchmark_results.json"
+STARTUP_SOCKET_PATH = "/tmp/reddit-tiktok-bench-worker.sock"
+
+# Story sizes in words, roughly a short post, a typical post and a long series entry
+STORY_SIZES = {
+    'small': 150,
+    'medium': 800,
+    'huge': 3000
+}
+
+# gTTS clips start and end with about this much silence
+TTS_EDGE_SILENCE = 0.4
+
+class FakeAuthor:
+    def __init__(self, name):
+        self.name = name
+
+class FakeSubmission:
+    """Minimal stand-in for a PRAW Submission loaded from a recorded listing"""
+    def __init__(self, data):
+        self.id = data['id']
+        self.title = data['title']
+        self.selftext = data['selftext']
+        self.permalink = data['permalink']
+        self.stickied = data['stickied']
+        self.score = data.get('score', 0)
+        self.author = FakeAuthor(data['author']) if data.get('author') else None
+
+def load_fixture_listing(path=FIXTURE_PATH):
+    """Load the recorded hot listing as fake submissions"""
+    with open(path, 'r') as f:
+        return [FakeSubmission(post) for post in json.load(f)['posts']]
+
+def make_story(text, word_count):
+    """Repeat fixture text until the story reaches the requested word count"""
+    words = text.split()
+    repeats = math.ceil(word_count / len(words))
+    return ' '.join((words * repeats)[:word_count])
+
+def fake_tts(text, sample_rate=NARRATION_SAMPLE_RATE):
+    """
+    Offline gTTS stand-in: an MP3 as long as gTTS would take to read the text,
+    with silent edges like real gTTS output. A quiet tone stands in for speech,
+    since pure silence would be trimmed away by the narration stage.
+    """
+    duration = estimate_narration_duration(text)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    voice = 0.1 * np.sin(2 * np.pi * 180 * t)
+    edge = np.zeros(int(TTS_EDGE_SILENCE * sample_rate))
+    samples = np.concatenate([edge, voice, edge]).astype(np.float32)
+    cmd = [
+        get_ffmpeg_binary(), '-v', 'error',
+        '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), '-i', '-',
+        '-f', 'mp3', '-'
+    ]
+    result = subprocess.run(cmd, input=samples.tobytes(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return result.stdout
+
+def ensure_background(duration):
+    """Generate (once) an ffmpeg testsrc background clip at least duration seconds long"""
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    seconds = int(math.ceil(duration)) + 5
+    path = os.path.join(ASSETS_DIR, f"background_{seconds}s.mp4")
+    if not os.path.exists(path):
+        cmd = [
+            get_ffmpeg_binary(), '-y', '-v', 'error',
+            '-f', 'lavfi', '-i', f"testsrc=size=1280x720:rate=30:duration={seconds}",
+            '-pix_fmt', 'yuv420p', '-c:v', 'libx264', '-preset', 'ultrafast',
+            path
+        ]
+        subprocess.run(cmd, check=True)
+    return path
+
+class StageTimer:
+    """Collects wall time per benchmark stage"""
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+async def run_story(size_name, word_count):
+    """Run every stage once for a story of the given size and return the stage timings"""
+    timer = StageTimer()
+
+    with timer.stage('fetch'):
+        post = next(p for p in load_fixture_listing() if not p.stickied)
+    text = make_story(post.selftext, word_count)
+
+    with timer.stage('split'):
+        chunks = split_content_into_chunks(text)
+
+    artifacts = ArtifactStore(job_id=f"bench-{size_name}")
+    chunk_images = []
+    chunk_audio = []
+    with timer.stage('render_cards'):
+        renderer = await CardRenderer().start()
+    try:
+        for i, chunk in enumerate(chunks):
+            with timer.stage('render_cards'):
+                png_bytes = await capture_reddit_post(
+                    f"https://www.reddit.com{post.permalink}",
+                    None,
+                    chunk,
+                    is_first_chunk=(i == 0),
+                    post_title=post.title,
+                    author=post.author.name,
+                    browser=renderer.browser
+                )
+                artifacts.put_image(f"chunk_{i}", png_bytes)
+                chunk_images.append(artifacts.get_image(f"chunk_{i}"))
+
+            with timer.stage('tts'):
+                narration_text = post.title + ". " + chunk if i == 0 else chunk
+                artifacts.put_audio(f"chunk_{i}", fake_tts(narration_text))
+                chunk_audio.append(artifacts.get_audio(f"chunk_{i}"))
+
+        with timer.stage('narration'):
+            narration_path = artifacts.path_for("narration.wav")
+            chunk_times, _ = build_narration(chunk_audio, narration_path, speed_factor=SPEED_FACTOR, gap=NARRATION_GAP)
+
+        # Background generation is setup, not part of the measured pipeline
+        background_path = ensure_background(chunk_times[-1][1])
+
+        with timer.stage('create_video_clips'):
+            clips = create_video_clips(chunk_images, chunk_times, background_path)
+
+        with timer.stage('concatenate'):
+            narration = AudioFileClip(narration_path)
+            final_clip = concatenate_videoclips(clips).set_audio(narration)
+
+        with timer.stage('encode'):
+            final_clip.write_videofile(
+                artifacts.path_for("output.mp4"),
+                fps=24,
+                codec='libx264',
+                audio_codec='aac',
+                logger=None
+            )
+
+        final_clip.close()
+        for clip in clips:
+            clip.close()
+        narration.close()
+    finally:
+        await renderer.close()
+        artifacts.cleanup()
+
+    return {'words': word_count, 'chunks': len(chunks), 'stages': timer.timings}
+
+async def run_benchmark(sizes, repeat):
+    """Run each story size repeat times and keep the median of every stage"""
+    results = {}
+    for size_name in sizes:
+        runs = []
+        for i in range(repeat):
+            print(f"Benchmarking {size_name} story (run {i+1}/{repeat})...")
+            runs.append(await run_story(size_name, STORY_SIZES[size_name]))
+        stages = {
+            stage: statistics.median(run['stages'][stage] for run in runs)
+            for stage in runs[0]['stages']
+        }
+        results[size_name] = {'words': runs[0]['words'], 'chunks': runs[0]['chunks'], 'stages': stages}
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'sizes': results
+    }
+
+def measure_startup(runs=5):
+    """
+    Compare job startup in a fresh process (interpreter plus every heavy import)
+    with the same warm-up request sent to an already running worker
+    """
+    from worker import submit_job, worker_available
+
+    cold = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main; main.warm_up()"], check=True)
+        cold.append(time.perf_counter() - start)
+
+    worker = subprocess.Popen([sys.executable, "worker.py", "--socket", STARTUP_SOCKET_PATH])
+    try:
+        deadline = time.time() + 120
+        while not worker_available(STARTUP_SOCKET_PATH):
+            if time.time() > deadline or worker.poll() is not None:
+                raise RuntimeError("Benchmark worker did not start")
+            time.sleep(0.5)
+        warm = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            submit_job({'command': 'warm_up'}, STARTUP_SOCKET_PATH)
+            warm.append(time.perf_counter() - start)
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    return {'cold_seconds': statistics.median(cold), 'warm_seconds': statistics.median(warm), 'runs': runs}
+
+def compare_results(baseline, current, threshold=0.15, min_delta=0.05):
+    """Return (size, stage, baseline, current) for every stage slower than the baseline by more than threshold"""
+    regressions = []
+    for size_name, result in current['sizes'].items():
+        base_stages = baseline['sizes'].get(size_name, {}).get('stages', {})
+        for stage, seconds in result['stages'].items():
+            base = base_stages.get(stage)
+            if base is None:
+                continue
+            if seconds > base * (1 + threshold) and seconds - base > min_delta:
+                regressions.append((size_name, stage, base, seconds))
+    return regressions
+
+def print_results(results):
+    for size_name, result in results['sizes'].items():
+        print(f"\n{size_name}: {result['words']} words, {result['chunks']} chunks")
+        for stage, seconds in result['stages'].items():
+            print(f"  {stage:<20} {seconds:8.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of every video pipeline stage")
+    parser.add_argument("--sizes", nargs="+", choices=list(STORY_SIZES), default=list(STORY_SIZES))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size; the median is reported")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Flag stages that regressed against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown before flagging, as a fraction")
+    parser.add_argument("--startup", action="store_true", help="Only measure cold vs. warm-worker job startup")
+    args = parser.parse_args()
+
+    if args.startup:
+        startup = measure_startup()
+        print(f"Cold job startup: {startup['cold_seconds']:.3f}s")
+        print(f"Warm worker job startup: {startup['warm_seconds']:.3f}s")
+        return
+
+    results = asyncio.run(run_benchmark(args.sizes, args.repeat))
+    print_results(results)
+
+    with open(RESULTS_PATH, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, threshold=args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for size_name, stage, base, seconds in regressions:
+                print(f"  {size_name}/{stage}: {base:.3f}s -> {seconds:.3f}s (+{(seconds / base - 1) * 100:.0f}%)")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import collections
+import logging
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Lines of child output kept for error reports
+TAIL_LINES = 200
+# Longest partial line buffered before it is flushed anyway
+MAX_LINE_BYTES = 64 * 1024
+# Progress bars redraw many times a second; log their state at most this often
+PROGRESS_LOG_INTERVAL = 10
+# Seconds between SIGTERM and SIGKILL for a child that ran out of time
+KILL_GRACE_SECONDS = 10
+# Longest wait for the output reader once the child is gone; a descendant that left
+# the process group could otherwise hold the pipe open forever
+READER_JOIN_SECONDS = 5
+
+# tqdm as used by MoviePy: "t:  45%|████▌     | 540/1200 [00:10<00:12, 52.3it/s, now=None]"
+TQDM_PATTERN = re.compile(r'(\d+)%\|[^|]*\|\s*(\d+)/(\d+)')
+# main.py: "Processing chunk 3/12..."
+CHUNK_PATTERN = re.compile(r'Processing chunk (\d+)/(\d+)')
+LINE_SPLIT = re.compile(rb'[\r\n]')
+
+def parse_progress(line):
+    """Return a progress dict for a progress bar or chunk counter line, else None"""
+    match = TQDM_PATTERN.search(line)
+    if match:
+        percent, current, total = (int(group) for group in match.groups())
+        return {'percent': percent, 'current': current, 'total': total}
+    match = CHUNK_PATTERN.search(line)
+    if match:
+        current, total = int(match.group(1)), int(match.group(2))
+        return {'percent': 100 * current // total, 'current': current, 'total': total}
+    return None
+
+class ChildProcess:
+    """
+    Runs a script with its stdout and stderr streamed line by line into the
+    logger instead of buffered until exit. Only a bounded tail is kept for
+    error reports, progress bars become a live status instead of log spam,
+    and a child that outlives its timeout is killed with its process group.
+    """
+    def __init__(self, command, name, timeout=None, env=None, tail_lines=TAIL_LINES, log=logger,
+                 kill_grace=KILL_GRACE_SECONDS):
+        self.command = command
+        self.name = name
+        self.timeout = timeout
+        self.kill_grace = kill_grace
+        self.env = dict(env if env is not None else os.environ)
+        # Python children would otherwise block-buffer a pipe until exit
+        self.env['PYTHONUNBUFFERED'] = "1"
+        self.log = log
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.status = {'stage': None, 'percent': None, 'current': None, 'total': None, 'line': None}
+        self.process = None
+        self.timed_out = False
+        self.started_at = None
+        self.duration = None
+        self._last_progress_log = 0.0
+        self._reader = None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=self.env,
+            bufsize=0,
+            # Own process group, so a kill also reaches ffmpeg and browsers the child started
+            start_new_session=True
+        )
+        self._reader = threading.Thread(target=self._read_output, name=f"{self.name}-output", daemon=True)
+        self._reader.start()
+        return self
+
+    def _read_output(self):
+        fd = self.process.stdout.fileno()
+        pending = b""
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            pending += data
+            # Both \n and tqdm's \r end a line
+            *lines, pending = LINE_SPLIT.split(pending)
+            if len(pending) > MAX_LINE_BYTES:
+                lines.append(pending)
+                pending = b""
+            for line in lines:
+                self._handle_line(line.decode(errors='replace').rstrip())
+        if pending:
+            self._handle_line(pending.decode(errors='replace').rstrip())
+        self.process.stdout.close()
+
+    def _handle_line(self, line):
+        if not line:
+            return
+        progress = parse_progress(line)
+        if progress is None:
+            self.tail.append(line)
+            self.status['line'] = line
+            self.log.info(f"[{self.name}] {line}")
+            return
+
+        finished = progress['current'] == progress['total']
+        self.status.update(progress, stage=self.name)
+        now = time.monotonic()
+        if finished or now - self._last_progress_log >= PROGRESS_LOG_INTERVAL:
+            self._last_progress_log = now
+            self.tail.append(line)
+            self.log.info(f"[{self.name}] {progress['percent']}% ({progress['current']}/{progress['total']})")
+
+    def _group_alive(self):
+        try:
+            os.killpg(self.process.pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+
+    def kill(self):
+        """
+        SIGTERM the child's process group, then SIGKILL the group after a
+        grace period unless every process in it has exited. The group is
+        killed even when the child itself exited, since a descendant that
+        ignores SIGTERM (a hung ffmpeg or browser) would keep the pipe open.
+        """
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.process.wait()
+            return
+        deadline = time.monotonic() + self.kill_grace
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None and not self._group_alive():
+                return
+            time.sleep(0.1)
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+
+    def wait(self):
+        """Wait for the child, killing it on timeout; returns its exit code"""
+        try:
+            self.process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.timed_out = True
+            self.log.error(f"[{self.name}] Timed out after {self.timeout} seconds, killing it")
+            self.kill()
+        self._reader.join(READER_JOIN_SECONDS)
+        if self._reader.is_alive():
+            self.log.warning(f"[{self.name}] Output still held open by a process outside its group, not waiting for it")
+        self.duration = time.monotonic() - self.started_at
+        return self.process.returncode
+
+    @property
+    def returncode(self):
+        return self.process.returncode if self.process else None
+
+    def tail_text(self):
+        """The last lines of output, for error reports"""
+        return "\n".join(self.tail)
+
+def run_child(command, name, timeout=None, env=None, log=logger, kill_grace=KILL_GRACE_SECONDS):
+    """Run a command to completion with streamed, bounded output; returns the finished ChildProcess"""
+    child = ChildProcess(command, name, timeout=timeout, env=env, log=log, kill_grace=kill_grace).start()
+    child.wait()
+    return child
@@ -0,0 +1,98 @@
+import logging
+import os
+import sys
+import time
+
+from childproc import run_child, parse_progress
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.created, record.getMessage()))
+
+def make_logger():
+    log = logging.getLogger(f"childproc-test-{time.monotonic_ns()}")
+    log.propagate = False
+    handler = ListHandler()
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    return log, handler
+
+def test_parse_progress():
+    line = "t:  45%|████▌     | 540/1200 [00:10<00:12, 52.3it/s, now=None]"
+    assert parse_progress(line) == {'percent': 45, 'current': 540, 'total': 1200}
+    assert parse_progress("Processing chunk 3/12...") == {'percent': 25, 'current': 3, 'total': 12}
+    assert parse_progress("Saving video...") is None
+
+def test_output_is_streamed_before_the_child_exits():
+    log, handler = make_logger()
+    script = "import time; print('first'); time.sleep(1); print('second')"
+    start = time.time()
+    child = run_child([sys.executable, "-c", script], "child", log=log)
+    assert child.returncode == 0
+    first = next(created for created, message in handler.messages if message == "[child] first")
+    assert first - start < 0.9
+
+def test_tail_is_bounded_and_progress_is_not_logged_per_frame():
+    log, handler = make_logger()
+    script = (
+        "import sys\n"
+        "for i in range(5000): print(f'line {i}')\n"
+        "for i in range(1, 1001): sys.stderr.write(f'\\rt: {i // 10:3d}%|#| {i}/1000 [00:01<00:01]')\n"
+        "sys.stderr.write('\\n')\n"
+        "sys.exit(3)\n"
+    )
+    child = run_child([sys.executable, "-c", script], "render", log=log)
+    assert child.returncode == 3
+    assert len(child.tail) == 200
+    assert child.tail[-1].endswith("1000/1000 [00:01<00:01]")
+    assert child.status['current'] == 1000
+    progress_messages = [message for _, message in handler.messages if "%" in message]
+    assert len(progress_messages) <= 3
+
+def test_hung_child_is_killed_on_timeout():
+    log, _ = make_logger()
+    start = time.time()
+    child = run_child([sys.executable, "-c", "import time; time.sleep(60)"], "hung", timeout=1, log=log)
+    assert child.timed_out
+    assert child.returncode != 0
+    assert time.time() - start < 15
+
+def process_gone(pid):
+    """Exited, or only a zombie waiting for init to reap it"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except FileNotFoundError:
+        return True
+
+def test_sigterm_ignoring_grandchild_is_killed():
+    log, _ = make_logger()
+    grandchild = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)"
+    script = (
+        "import subprocess, sys, time\n"
+        f"child = subprocess.Popen([sys.executable, '-c', {grandchild!r}])\n"
+        "print(f'grandchild {child.pid}', flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    start = time.time()
+    child = run_child([sys.executable, "-c", script], "hung", timeout=1, log=log, kill_grace=1)
+    # The grandchild still held the output pipe after the child died of SIGTERM
+    assert time.time() - start < 10
+    assert child.timed_out
+    pid = int(next(line for line in child.tail if line.startswith("grandchild")).split()[1])
+    deadline = time.time() + 5
+    while not process_gone(pid) and time.time() < deadline:
+        time.sleep(0.1)
+    assert process_gone(pid)
+
+if __name__ == "__main__":
+    test_parse_progress()
+    test_output_is_streamed_before_the_child_exits()
+    test_tail_is_bounded_and_progress_is_not_logged_per_frame()
+    test_hung_child_is_killed_on_timeout()
+    test_sigterm_ignoring_grandchild_is_killed()
+    print("All child process tests passed")
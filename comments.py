@@ -0,0 +1,129 @@
+import json
+import os
+import time
+
+COMMENT_CACHE_DIR = "comment_cache"
+# A cached selection is reused for this long, so retries and re-renders narrate the same comments
+COMMENT_CACHE_MAX_AGE = 6 * 3600
+# Comments asked for in the single thread request; MoreComments stubs beyond it are dropped, not expanded
+FETCH_LIMIT = 200
+# Reply levels Reddit returns: 0 keeps top-level comments only, 1 also their direct replies
+MAX_DEPTH = 1
+MAX_COMMENTS = 6
+# Total words narrated from comments, about three minutes of sped-up TTS
+MAX_WORDS = 450
+# A single comment longer than this would crowd out every other one
+MAX_COMMENT_WORDS = 150
+# A reply is only kept if it scored at least this fraction of its parent
+REPLY_SCORE_FRACTION = 0.25
+SKIPPED_AUTHORS = {"AutoModerator", "[deleted]"}
+SKIPPED_BODIES = {"[deleted]", "[removed]"}
+
+def fetch_thread(reddit, post_id, limit=FETCH_LIMIT, max_depth=MAX_DEPTH):
+    """
+    Fetch a post and its top comments in one request, capped at limit
+    comments and max_depth reply levels on Reddit's side. PRAW's own
+    submission fetch only sends sort and limit, so it would still return
+    every reply level. Returns (submission, flattened comment records).
+    """
+    post_listing, comment_listing = reddit.get(
+        f"/comments/{post_id}/", params={'sort': "top", 'limit': limit, 'depth': max_depth + 1}
+    )
+    return post_listing.children[0], flatten_comments(comment_listing.children, max_depth)
+
+def flatten_comments(comments, max_depth=MAX_DEPTH):
+    """
+    Walk a fetched comment tree into plain records, breadth first. The
+    MoreComments stubs are skipped rather than expanded (what
+    replace_more(limit=0) does), so the walk never touches the network.
+    """
+    records = []
+    pending = [(comment, 0) for comment in comments]
+    while pending:
+        comment, depth = pending.pop(0)
+        # MoreComments stubs carry no body
+        if not hasattr(comment, 'body'):
+            continue
+        records.append({
+            'id': comment.id,
+            'parent_id': comment.parent_id.split("_", 1)[-1],
+            'author': comment.author.name if comment.author else "[deleted]",
+            'body': comment.body,
+            'score': comment.score,
+            'depth': depth,
+            'stickied': comment.stickied,
+            'distinguished': comment.distinguished
+        })
+        if depth < max_depth:
+            pending.extend((reply, depth + 1) for reply in comment.replies)
+    return records
+
+def narratable(comment):
+    """Skip bots, moderator notes, removed comments and walls of text"""
+    if comment['author'] in SKIPPED_AUTHORS or comment['body'].strip() in SKIPPED_BODIES:
+        return False
+    if comment['stickied'] or comment['distinguished']:
+        return False
+    word_count = len(comment['body'].split())
+    return 0 < word_count <= MAX_COMMENT_WORDS
+
+def select_comments(records, max_comments=MAX_COMMENTS, max_words=MAX_WORDS):
+    """
+    Pick the comments to narrate: top-level comments by score, each
+    followed by its best reply when that reply holds its own, until the
+    comment or word budget runs out. Returned in narration order.
+    """
+    candidates = [comment for comment in records if narratable(comment)]
+    replies = {}
+    for comment in candidates:
+        if comment['depth'] > 0:
+            replies.setdefault(comment['parent_id'], []).append(comment)
+
+    selected = []
+    words = 0
+    top_level = sorted((c for c in candidates if c['depth'] == 0), key=lambda c: c['score'], reverse=True)
+    for comment in top_level:
+        thread = [comment]
+        best_reply = max(replies.get(comment['id'], []), key=lambda c: c['score'], default=None)
+        if best_reply and best_reply['score'] >= REPLY_SCORE_FRACTION * comment['score']:
+            thread.append(best_reply)
+
+        for entry in thread:
+            entry_words = len(entry['body'].split())
+            if len(selected) >= max_comments or words + entry_words > max_words:
+                break
+            selected.append(entry)
+            words += entry_words
+        if len(selected) >= max_comments:
+            break
+    return selected
+
+def cache_path(post_id, cache_dir=COMMENT_CACHE_DIR):
+    return os.path.join(cache_dir, f"{post_id}.json")
+
+def load_cached_comments(post_id, max_age=COMMENT_CACHE_MAX_AGE, cache_dir=COMMENT_CACHE_DIR):
+    """The cached selection for a post, or None if missing or older than max_age"""
+    try:
+        with open(cache_path(post_id, cache_dir), 'r') as f:
+            cached = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if time.time() - cached['fetched_at'] > max_age:
+        return None
+    return cached['comments']
+
+def save_cached_comments(post_id, comments, cache_dir=COMMENT_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(post_id, cache_dir)
+    with open(path + ".tmp", 'w') as f:
+        json.dump({'post_id': post_id, 'fetched_at': time.time(), 'comments': comments}, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+def comment_snapshot(post_id, records, cache_dir=COMMENT_CACHE_DIR):
+    """Select the comments to narrate from fetched records and cache them as plain dicts"""
+    comments = [
+        {'id': c['id'], 'author': c['author'], 'body': c['body'], 'score': c['score'], 'depth': c['depth']}
+        for c in select_comments(records)
+    ]
+    save_cached_comments(post_id, comments, cache_dir)
+    return comments
@@ -0,0 +1,101 @@
+import json
+import tempfile
+import time
+
+from comments import (
+    fetch_thread, select_comments, load_cached_comments, save_cached_comments, cache_path
+)
+
+class FakeAuthor:
+    def __init__(self, name):
+        self.name = name
+
+class FakeComment:
+    def __init__(self, comment_id, parent_id, body, score, author="someone", replies=(), stickied=False, distinguished=None):
+        self.id = comment_id
+        self.parent_id = parent_id
+        self.body = body
+        self.score = score
+        self.author = FakeAuthor(author) if author else None
+        self.replies = list(replies)
+        self.stickied = stickied
+        self.distinguished = distinguished
+
+class FakeMoreComments:
+    """Stands in for PRAW's MoreComments stub, which has no body"""
+    id = "more"
+
+class FakeListing:
+    def __init__(self, children):
+        self.children = children
+
+class FakeReddit:
+    """Answers /comments/<id> like PRAW's objector: a post listing and a comment listing"""
+    def __init__(self, comments):
+        self.comments = comments
+        self.requests = []
+
+    def get(self, path, params=None):
+        self.requests.append((path, params))
+        return [FakeListing(["post"]), FakeListing(self.comments)]
+
+def make_reddit():
+    deep = FakeComment("c4", "t1_c3", "too deep to narrate", 500)
+    return FakeReddit([
+        FakeComment("c1", "t3_abc123", "Posting rules, read them.", 10000, author="AutoModerator", stickied=True),
+        FakeComment("c2", "t3_abc123", "NTA, your sister is out of line here.", 900, replies=[
+            FakeComment("c3", "t1_c2", "Agreed, and she owes you an apology.", 400, replies=[deep]),
+            FakeComment("c5", "t1_c2", "Meh.", 3)
+        ]),
+        FakeComment("c6", "t3_abc123", "[removed]", 800),
+        FakeComment("c7", "t3_abc123", "YTA for skipping the wedding.", 600, replies=[
+            FakeComment("c8", "t1_c7", "Nope.", 20),
+            FakeMoreComments()
+        ]),
+        FakeMoreComments()
+    ])
+
+def fetch_records():
+    return fetch_thread(make_reddit(), "abc123")[1]
+
+def test_fetch_is_one_bounded_request():
+    reddit = make_reddit()
+    post, records = fetch_thread(reddit, "abc123", limit=200, max_depth=1)
+    assert post == "post"
+    assert reddit.requests == [("/comments/abc123/", {'sort': "top", 'limit': 200, 'depth': 2})]
+    # Deeper replies and MoreComments stubs are left out of the walk
+    assert {record['id'] for record in records} == {"c1", "c2", "c3", "c5", "c6", "c7", "c8"}
+    assert next(r for r in records if r['id'] == "c3")['parent_id'] == "c2"
+
+def test_selection_skips_moderation_and_keeps_strong_replies():
+    selected = select_comments(fetch_records())
+    # c3 follows its parent; c8 scored too little next to c7 to be worth narrating
+    assert [comment['id'] for comment in selected] == ["c2", "c3", "c7"]
+
+def test_selection_respects_budgets():
+    records = fetch_records()
+    assert [c['id'] for c in select_comments(records, max_comments=2)] == ["c2", "c3"]
+    # c2 and c3 fit in 16 words, c7 does not
+    assert [c['id'] for c in select_comments(records, max_words=16)] == ["c2", "c3"]
+
+def test_cached_selection_expires():
+    with tempfile.TemporaryDirectory() as tmp:
+        comments = [{'id': "c2", 'author': "someone", 'body': "NTA", 'score': 900, 'depth': 0}]
+        save_cached_comments("abc123", comments, cache_dir=tmp)
+        assert load_cached_comments("abc123", cache_dir=tmp) == comments
+
+        path = cache_path("abc123", tmp)
+        with open(path) as f:
+            cached = json.load(f)
+        cached['fetched_at'] = time.time() - 7 * 3600
+        with open(path, 'w') as f:
+            json.dump(cached, f)
+        assert load_cached_comments("abc123", cache_dir=tmp) is None
+        assert load_cached_comments("missing", cache_dir=tmp) is None
+
+if __name__ == "__main__":
+    test_fetch_is_one_bounded_request()
+    test_selection_skips_moderation_and_keeps_strong_replies()
+    test_selection_respects_budgets()
+    test_cached_selection_expires()
+    print("All comment tests passed")
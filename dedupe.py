@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_PATH = "dedupe.db"
+# Stories sharing at least this fraction of shingles count as duplicates
+DEFAULT_THRESHOLD = 0.8
+SHINGLE_WORDS = 5
+# 16 bands of 8 rows puts the LSH candidate threshold near 0.7, just under DEFAULT_THRESHOLD
+NUM_BANDS = 16
+ROWS_PER_BAND = 8
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+# Odd multiplier of the polynomial shingle hash, which wraps mod 2**64
+SHINGLE_BASE = np.uint64(1000003)
+# Bumped whenever signatures change, since old and new signatures cannot be compared
+SIGNATURE_VERSION = "2"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    post_id TEXT PRIMARY KEY,
+    title TEXT,
+    signature BLOB NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    post_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def shingle_hashes(text, size=SHINGLE_WORDS):
+    """
+    64-bit hashes of every run of size consecutive normalized words. Repeated
+    shingles are left in, since they cannot change a minimum.
+    """
+    words = re.findall(rb"[a-z0-9']+", text.lower().encode())
+    if len(words) < size:
+        words = words + [b''] * (size - len(words))
+    word_hashes = np.fromiter(map(zlib.crc32, words), dtype=np.uint64, count=len(words))
+    # Each word is hashed once; the shingle hashes are built from them in size vectorized steps
+    count = len(words) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for i in range(size):
+        hashes = hashes * SHINGLE_BASE + word_hashes[i:i + count]
+    return hashes
+
+class MinHasher:
+    """
+    Computes MinHash signatures with NUM_PERM fixed multiply-shift hash
+    functions: the top 32 bits of (a * x + b) mod 2**64 for an odd a. The
+    modulo is the uint64 wraparound itself, so there is no division pass.
+    """
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(0, 2**64 - 1, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.randint(0, 2**64 - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        hashes = shingle_hashes(text)
+        # (num_perm, num_shingles) in one vectorized pass, then the minimum per permutation;
+        # the shift is monotonic, so it is applied to the minimum instead of every entry
+        permuted = np.multiply(self.a[:, None], hashes[None, :])
+        permuted += self.b[:, None]
+        return (permuted.min(axis=1) >> np.uint64(32)).astype(np.uint32)
+
+def band_buckets(signature):
+    """Hash each band of the signature to a 64-bit bucket id"""
+    bands = signature.reshape(NUM_BANDS, ROWS_PER_BAND)
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), 'big', signed=True)
+        for band in bands
+    ]
+
+class DedupeIndex:
+    """
+    Persistent MinHash/LSH index of every story already rendered. A lookup
+    is one indexed query per band plus a signature comparison for each
+    candidate, so it stays fast with hundreds of thousands of stories.
+    """
+    def __init__(self, path=DEDUPE_PATH, threshold=DEFAULT_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.hasher = MinHasher()
+        self._local = threading.local()
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+        self._check_version(conn)
+
+    def _check_version(self, conn):
+        """Drop signatures made by another hashing scheme, which would never match new ones"""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'signature_version'").fetchone()
+        if row is not None and row[0] == SIGNATURE_VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stale = conn.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+            if stale:
+                logger.warning(f"Dropping {stale} dedupe signatures from an older hashing scheme")
+                conn.execute("DELETE FROM stories")
+                conn.execute("DELETE FROM buckets")
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('signature_version', ?)", (SIGNATURE_VERSION,)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def connect(self):
+        """One connection per thread, since the pipeline checks from several threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def find_similar(self, text, exclude=None):
+        """
+        Return (post_id, estimated similarity) of the closest indexed story, or
+        (None, 0.0). The story's own post id is passed as exclude, so a retry
+        of an indexed post never matches itself.
+        """
+        signature = self.hasher.signature(text)
+        conn = self.connect()
+        candidates = set()
+        for band, bucket in enumerate(band_buckets(signature)):
+            rows = conn.execute(
+                "SELECT post_id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket)
+            ).fetchall()
+            candidates.update(row[0] for row in rows)
+        candidates.discard(exclude)
+
+        best_id, best_similarity = None, 0.0
+        for post_id in candidates:
+            row = conn.execute("SELECT signature FROM stories WHERE post_id = ?", (post_id,)).fetchone()
+            if row is None:
+                continue
+            similarity = float(np.mean(np.frombuffer(row[0], dtype=np.uint32) == signature))
+            if similarity > best_similarity:
+                best_id, best_similarity = post_id, similarity
+        return best_id, best_similarity
+
+    def is_duplicate(self, text, post_id=None):
+        """Return (is_duplicate, matching post_id, similarity) for a candidate story"""
+        post_id, similarity = self.find_similar(text, exclude=post_id)
+        return similarity >= self.threshold, post_id, similarity
+
+    def add(self, post_id, text, title=""):
+        """Index a rendered story"""
+        signature = self.hasher.signature(text)
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM buckets WHERE post_id = ?", (post_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO stories (post_id, title, signature, added_at) VALUES (?, ?, ?, ?)",
+                (post_id, title, signature.tobytes(), time.time())
+            )
+            conn.executemany(
+                "INSERT INTO buckets (band, bucket, post_id) VALUES (?, ?, ?)",
+                [(band, bucket, post_id) for band, bucket in enumerate(band_buckets(signature))]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def __len__(self):
+        return self.connect().execute("SELECT COUNT(*) FROM stories").fetchone()[0]
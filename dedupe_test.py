@@ -0,0 +1,88 @@
+import os
+import random
+import tempfile
+import time
+
+from dedupe import DedupeIndex
+
+WORDS = (
+    "the house at the end of our street had been empty for years until a family moved in last "
+    "winter and every night since then I have heard someone knocking on my bedroom window even "
+    "though it is on the second floor and there is nothing outside to climb"
+).split()
+
+def story(seed, length=300):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randint(0, 50)) for _ in range(length))
+
+def lightly_edited(text, every=60):
+    """Change one word in every `every`, the way a repost is touched up"""
+    words = text.split()
+    for i in range(0, len(words), every):
+        words[i] = "edited"
+    return " ".join(words)
+
+def make_index(tmp, threshold=0.8):
+    return DedupeIndex(os.path.join(tmp, "dedupe.db"), threshold=threshold)
+
+def test_near_duplicate_is_detected():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = make_index(tmp)
+        original = story(1)
+        index.add("orig", original, "Original")
+        index.add("other", story(2), "Other")
+
+        duplicate, match_id, similarity = index.is_duplicate(lightly_edited(original), "repost")
+        assert duplicate and match_id == "orig" and similarity >= 0.8
+
+        duplicate, _, similarity = index.is_duplicate(story(3), "new")
+        assert not duplicate and similarity < 0.5
+
+def test_threshold_sets_the_cutoff():
+    with tempfile.TemporaryDirectory() as tmp:
+        original = story(1)
+        edited = lightly_edited(original)
+        index = make_index(tmp)
+        index.add("orig", original)
+        _, _, similarity = index.is_duplicate(edited, "repost")
+        assert 0.7 < similarity < 0.95
+
+        index.threshold = similarity - 0.05
+        assert index.is_duplicate(edited, "repost")[0]
+        index.threshold = similarity + 0.05
+        assert not index.is_duplicate(edited, "repost")[0]
+
+def test_story_never_matches_itself():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = make_index(tmp)
+        text = story(1)
+        index.add("abc", text)
+        # A retry of an indexed post is not its own duplicate
+        assert index.is_duplicate(text, "abc") == (False, None, 0.0)
+        # Another post with the same text still is
+        duplicate, match_id, similarity = index.is_duplicate(text, "copy")
+        assert duplicate and match_id == "abc" and similarity == 1.0
+        # Re-adding a post replaces its entry instead of duplicating it
+        index.add("abc", text)
+        assert len(index) == 1
+
+def test_lookup_stays_fast_with_a_large_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = make_index(tmp)
+        for i in range(2000):
+            index.add(f"post{i}", story(i))
+        text = story(-1, length=800)
+        timings = []
+        for _ in range(21):
+            start = time.perf_counter()
+            index.is_duplicate(text, "new")
+            timings.append(time.perf_counter() - start)
+        # About 0.7 ms on a typical machine; the bound leaves room for slower ones
+        assert sorted(timings)[10] < 0.0015
+
+if __name__ == "__main__":
+    test_near_duplicate_is_detected()
+    test_threshold_sets_the_cutoff()
+    test_story_never_matches_itself()
+    test_lookup_stays_fast_with_a_large_index()
+    print("All dedupe tests passed")
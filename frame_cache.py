@@ -0,0 +1,265 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAME_CACHE_DIR = "reddit-tiktok-frames"
+# Total bytes of decoded frames kept on the host; 0 disables the cache
+FRAME_CACHE_BYTES = int(os.getenv('FRAME_CACHE_BYTES', 2 * 1024**3))
+# Largest block decoded per fill: 10 frames at 1080x1920
+BLOCK_BYTES = 64 * 1024**2
+# Blocks are also kept at or below this fraction of the budget, so many jobs' blocks fit at once
+MIN_BUDGET_BLOCKS = 16
+# The budget is capped at this fraction of the filesystem holding the cache
+MAX_FILESYSTEM_FRACTION = 0.5
+# Blocks each process keeps mapped
+MAPPED_BLOCKS = 4
+# Blocks touched this recently are not evicted, so a block is not deleted between its fill and its first map
+EVICT_MIN_AGE = 10
+# Attempts at mapping a block that another process's eviction deleted anyway
+MAP_ATTEMPTS = 3
+
+class FrameCacheError(Exception):
+    """The cache cannot hold or decode frames here; callers decode the background themselves instead"""
+
+def frame_cache_enabled():
+    return FRAME_CACHE_BYTES > 0
+
+class FrameCache:
+    """
+    Per-host store of background frames, already scaled and cropped to one
+    output size, in raw RGB block files under /dev/shm. A block is decoded
+    by a single ffmpeg run the first time any process asks for one of its
+    frames, and every process then maps the same file and reads frames
+    zero-copy. Blocks are published atomically and filled under an fcntl
+    range lock, so concurrent jobs never decode the same block twice; the
+    least recently used blocks are evicted once the cache exceeds its budget.
+    """
+    def __init__(self, background_path, output_size, max_bytes=FRAME_CACHE_BYTES, root=None):
+        self.background_path = os.path.abspath(background_path)
+        self.width, self.height = output_size
+        self.fps, self.duration = self._probe()
+        # From container metadata, so it can overshoot; lowered once a block past the end decodes empty
+        self.frame_count = int(self.duration * self.fps)
+        self.frame_bytes = self.width * self.height * 3
+
+        # Keyed by the file's identity and the output size, so an edited background never reuses stale frames
+        stat = os.stat(self.background_path)
+        identity = f"{self.background_path}:{stat.st_size}:{stat.st_mtime_ns}:{self.width}x{self.height}"
+        if root is None:
+            from artifacts import default_spill_root
+            root = default_spill_root()
+        self.root = os.path.join(root, FRAME_CACHE_DIR)
+        self.directory = os.path.join(self.root, hashlib.sha1(identity.encode()).hexdigest()[:16])
+        os.makedirs(self.directory, exist_ok=True)
+
+        # A small tmpfs (Docker gives /dev/shm 64 MB) gets a budget it can actually hold
+        fs = os.statvfs(self.directory)
+        self.max_bytes = min(max_bytes, int(fs.f_blocks * fs.f_frsize * MAX_FILESYSTEM_FRACTION))
+        block_bytes = min(BLOCK_BYTES, self.max_bytes // MIN_BUDGET_BLOCKS)
+        self.block_frames = block_bytes // self.frame_bytes
+        if self.block_frames < 1:
+            raise FrameCacheError(
+                f"A {self.max_bytes // 1024**2} MB frame cache is too small for {self.width}x{self.height} frames"
+            )
+
+        self._mapped = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _probe(self):
+        """Frame rate and duration of the background"""
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+        infos = ffmpeg_parse_infos(self.background_path)
+        return infos['video_fps'], infos['video_duration']
+
+    def block_path(self, block):
+        return os.path.join(self.directory, f"block_{block:06d}.rgb")
+
+    def _write_frames(self, block, f):
+        """Decode one block with ffmpeg into f, scaled to fit the height and cropped (or padded) to the width"""
+        from audio import get_ffmpeg_binary
+
+        start_frame = block * self.block_frames
+        scale = (
+            f"scale=-2:{self.height},"
+            f"crop=min(iw\\,{self.width}):{self.height},"
+            f"pad={self.width}:{self.height}:(ow-iw)/2:0:black"
+        )
+        cmd = [
+            get_ffmpeg_binary(), '-v', 'error',
+            '-ss', f"{start_frame / self.fps:.6f}", '-i', self.background_path,
+            '-frames:v', str(self.block_frames),
+            '-vf', scale,
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+            '-'
+        ]
+        subprocess.run(cmd, stdout=f, stderr=subprocess.PIPE, check=True)
+
+    def _decode_block(self, block, path):
+        """Fill a block into a temp file and publish it, leaving nothing behind if the fill fails"""
+        needed = self.block_frames * self.frame_bytes
+        fs = os.statvfs(self.directory)
+        if fs.f_bavail * fs.f_frsize < needed:
+            self.evict(reserve=needed)
+            fs = os.statvfs(self.directory)
+            if fs.f_bavail * fs.f_frsize < needed:
+                raise FrameCacheError(f"No room for a {needed // 1024**2} MB frame block in {self.directory}")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                self._write_frames(block, f)
+            # Publishing by rename means readers only ever see complete blocks
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _ensure_block(self, block):
+        """Return the path of a filled block, decoding it if no process has yet"""
+        path = self.block_path(block)
+        if os.path.exists(path):
+            return path
+        with open(os.path.join(self.directory, "blocks.lock"), 'a+') as lock_file:
+            # One byte of the lock file per block: jobs wanting other blocks are not held up
+            fcntl.lockf(lock_file, fcntl.LOCK_EX, 1, block)
+            try:
+                if not os.path.exists(path):
+                    self._decode_block(block, path)
+            finally:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN, 1, block)
+        self.evict()
+        return path
+
+    def _open_block(self, block):
+        """Open a filled block, decoding it again if an eviction deleted it in the meantime"""
+        for attempt in range(MAP_ATTEMPTS):
+            path = self._ensure_block(block)
+            try:
+                return open(path, 'rb')
+            except FileNotFoundError:
+                if attempt == MAP_ATTEMPTS - 1:
+                    raise
+
+    def _map_block(self, block):
+        """
+        An mmap of a block, kept open for the next frames of the same block,
+        or None if the block holds no frame because it lies past the end
+        """
+        if block in self._mapped:
+            self._mapped.move_to_end(block)
+            return self._mapped[block]
+        with self._open_block(block) as f:
+            if os.fstat(f.fileno()).st_size < self.frame_bytes:
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # The mtime doubles as the block's last use for host-wide LRU eviction
+            os.utime(f.fileno())
+        self._mapped[block] = mapped
+        if len(self._mapped) > MAPPED_BLOCKS:
+            # Views into an evicted map may still be held by a compositor, so let GC close it
+            self._mapped.popitem(last=False)
+        return mapped
+
+    def get_frame(self, t):
+        """Read-only view of the background frame shown at t seconds"""
+        with self._lock:
+            index = min(int(self.fps * t + 0.00001), self.frame_count - 1)
+            block, offset = divmod(index, self.block_frames)
+            mapped = self._map_block(block)
+            while mapped is None:
+                # The metadata promised frames the file does not have, so the previous block ends the video
+                if block == 0:
+                    raise ValueError(f"ffmpeg decoded no frames from {self.background_path}")
+                block -= 1
+                self.frame_count = (block + 1) * self.block_frames
+                offset = self.block_frames - 1
+                mapped = self._map_block(block)
+        # The last block of the video may hold fewer frames than block_frames
+        offset = min(offset, len(mapped) // self.frame_bytes - 1)
+        return np.frombuffer(mapped, dtype=np.uint8, count=self.frame_bytes,
+                             offset=offset * self.frame_bytes).reshape(self.height, self.width, 3)
+
+    def evict(self, reserve=0):
+        """
+        Delete the least recently used blocks of every cached background
+        until the cache, plus reserve bytes about to be written, fits its budget
+        """
+        with open(os.path.join(self.root, "evict.lock"), 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            now = time.time()
+            blocks = []
+            for directory in os.scandir(self.root):
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory.path):
+                    if entry.name.endswith(".rgb"):
+                        stat = entry.stat()
+                        blocks.append((stat.st_mtime, entry.path, stat.st_size))
+            total = sum(size for _, _, size in blocks) + reserve
+            # Unlinking is safe even while another process has the block mapped
+            for mtime, path, size in sorted(blocks):
+                if total <= self.max_bytes or now - mtime < EVICT_MIN_AGE:
+                    break
+                os.remove(path)
+                total -= size
+
+def open_frame_cache(background_path, output_size):
+    """The host-wide cache for a background, or None when it is off or cannot run on this host"""
+    if not frame_cache_enabled():
+        return None
+    try:
+        return FrameCache(background_path, output_size)
+    except (FrameCacheError, OSError) as e:
+        logger.warning(f"Frame cache unavailable, decoding the background in this process: {e}")
+        return None
+
+def fit_frame(frame, width):
+    """Center-crop or pad a frame to width, the way the cache's ffmpeg filter does"""
+    import numpy as np
+
+    frame_width = frame.shape[1]
+    if frame_width >= width:
+        left = (frame_width - width) // 2
+        return frame[:, left:left + width]
+    padded = np.zeros((frame.shape[0], width, frame.shape[2]), dtype=frame.dtype)
+    left = (width - frame_width) // 2
+    padded[:, left:left + frame_width] = frame
+    return padded
+
+def frame_cache_clip(cache, start_time, duration):
+    """
+    A MoviePy clip of the cached background from start_time, standing in
+    for VideoFileClip(...).subclip(...).resize(...) in the compositor. If
+    the cache fails mid-render (a full tmpfs, a failed ffmpeg fill), the
+    rest of the frames come from a VideoFileClip instead of failing the render.
+    """
+    from moviepy.video.VideoClip import VideoClip
+
+    fallback = []
+
+    def make_frame(t):
+        if not fallback:
+            try:
+                return cache.get_frame(start_time + t)
+            except (FrameCacheError, OSError, subprocess.CalledProcessError, ValueError) as e:
+                import moviepy.editor as mpy
+                logger.warning(f"Frame cache failed, decoding the background in this process: {e}")
+                fallback.append(mpy.VideoFileClip(cache.background_path, audio=False).resize(height=cache.height))
+        return fit_frame(fallback[0].get_frame(start_time + t), cache.width)
+
+    clip = VideoClip(make_frame, duration=duration)
+    clip.fps = cache.fps
+    return clip
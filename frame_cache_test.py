@@ -0,0 +1,113 @@
+import os
+import subprocess
+import tempfile
+import time
+
+import frame_cache
+from frame_cache import FrameCache
+
+WIDTH, HEIGHT = 4, 2
+FRAME_BYTES = WIDTH * HEIGHT * 3
+BLOCK_FRAMES = 5
+# Budget that makes each block BLOCK_FRAMES frames
+MAX_BYTES = frame_cache.MIN_BUDGET_BLOCKS * BLOCK_FRAMES * FRAME_BYTES
+
+class FakeCache(FrameCache):
+    """Writes numbered frames (every byte is the frame index) instead of running ffmpeg"""
+    def __init__(self, tmp, fills, duration=3.0, real_frames=None, fail=False,
+                 output_size=(WIDTH, HEIGHT), max_bytes=MAX_BYTES):
+        self.fake_duration = duration
+        self.real_frames = real_frames
+        self.fills = fills
+        self.fail = fail
+        background = os.path.join(tmp, "background.mp4")
+        if not os.path.exists(background):
+            with open(background, 'wb') as f:
+                f.write(b"video")
+        super().__init__(background, output_size, max_bytes=max_bytes, root=tmp)
+
+    def _probe(self):
+        return 10.0, self.fake_duration
+
+    def _write_frames(self, block, f):
+        self.fills.append(block)
+        first = block * self.block_frames
+        last = first + self.block_frames
+        if self.real_frames is not None:
+            last = min(last, self.real_frames)
+        for index in range(first, last):
+            f.write(bytes([index % 256]) * FRAME_BYTES)
+            if self.fail:
+                raise subprocess.CalledProcessError(1, "ffmpeg")
+
+def block_files(cache):
+    return sorted(name for name in os.listdir(cache.directory) if name != "blocks.lock")
+
+def test_blocks_are_filled_once_and_shared():
+    with tempfile.TemporaryDirectory() as tmp:
+        fills = []
+        cache = FakeCache(tmp, fills)
+        assert cache.block_frames == BLOCK_FRAMES
+        assert cache.get_frame(0.0)[0, 0, 0] == 0
+        assert cache.get_frame(0.3)[0, 0, 0] == 3
+        assert block_files(cache) == ["block_000000.rgb"]
+
+        # Another process opening the same background maps the published block
+        other = FakeCache(tmp, fills)
+        assert other.get_frame(0.4)[0, 0, 0] == 4
+        assert other.get_frame(0.7)[0, 0, 0] == 7
+        assert fills == [0, 1]
+
+def test_failed_fill_leaves_no_temp_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FakeCache(tmp, [], fail=True)
+        try:
+            cache.get_frame(0.0)
+            assert False, "fill should have failed"
+        except subprocess.CalledProcessError:
+            pass
+        assert block_files(cache) == []
+
+def test_short_background_clamps_to_last_frame():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Metadata promises 30 frames, the file decodes 12
+        cache = FakeCache(tmp, [], duration=3.0, real_frames=12)
+        assert cache.get_frame(2.9)[0, 0, 0] == 11
+        assert cache.frame_count == 15
+        assert cache.get_frame(1.0)[0, 0, 0] == 10
+
+def test_least_recently_used_blocks_are_evicted():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FakeCache(tmp, [], duration=10.0)
+        for block in range(frame_cache.MIN_BUDGET_BLOCKS):
+            cache.get_frame(block * BLOCK_FRAMES / 10)
+        # Freshly used blocks are kept even over budget, so a new block is never deleted before it is mapped
+        cache.get_frame(frame_cache.MIN_BUDGET_BLOCKS * BLOCK_FRAMES / 10)
+        assert len(block_files(cache)) == frame_cache.MIN_BUDGET_BLOCKS + 1
+
+        now = time.time()
+        for block in range(frame_cache.MIN_BUDGET_BLOCKS + 1):
+            age = 100 if block != 0 else 50
+            os.utime(cache.block_path(block), (now - age - block, now - age - block))
+        cache.evict()
+        # Block 0 was used last, so the oldest other block went instead
+        remaining = block_files(cache)
+        assert len(remaining) == frame_cache.MIN_BUDGET_BLOCKS
+        assert "block_000000.rgb" in remaining
+        assert f"block_{frame_cache.MIN_BUDGET_BLOCKS:06d}.rgb" not in remaining
+
+def test_small_filesystem_is_refused():
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            FakeCache(tmp, [], output_size=(1080, 1920), max_bytes=64 * 1024**2)
+            assert False, "a 64 MB budget cannot hold 16 full-size frames"
+        except frame_cache.FrameCacheError:
+            pass
+
+if __name__ == "__main__":
+    test_blocks_are_filled_once_and_shared()
+    test_failed_fill_leaves_no_temp_file()
+    test_short_background_clamps_to_last_frame()
+    test_least_recently_used_blocks_are_evicted()
+    test_small_filesystem_is_refused()
+    print("All frame cache tests passed")
@@ -0,0 +1,241 @@
+import hashlib
+import http.client
+import json
+import logging
+import os
+import pickle
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Modelled on TikTok's Content Posting API: an init call returns an upload
+# URL, then the file is PUT in chunks with Content-Range headers. Every chunk
+# but the last is answered with 206, the last one with 201.
+UPLOAD_API_URL = os.getenv('TIKTOK_UPLOAD_API_URL', "https://open.tiktokapis.com")
+INIT_PATH = "/v2/post/publish/video/init/"
+# TikTok accepts chunks between 5 and 64 MB; only one chunk is held in memory at a time
+CHUNK_SIZE = 10 * 1024 * 1024
+MAX_CHUNK_RETRIES = 5
+RETRY_DELAY = 1
+REQUEST_TIMEOUT = 60
+# Transient statuses worth retrying a chunk for; anything else is fatal
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class UploadError(Exception):
+    pass
+
+class UploadExpired(UploadError):
+    """The server no longer knows the upload session, so it has to start over"""
+
+def load_cookie_header(cookies_file, domain="tiktok.com"):
+    """Build a Cookie header from the cookies pickled by the Selenium login"""
+    with open(cookies_file, "rb") as f:
+        cookies = pickle.load(f)
+    return "; ".join(
+        f"{cookie['name']}={cookie['value']}"
+        for cookie in cookies
+        if domain in cookie.get('domain', domain)
+    )
+
+class ConnectionPool:
+    """Keep-alive connections reused per (scheme, host, port), reopened after any failure"""
+    def __init__(self, timeout=REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.connections = {}
+        self.opened = 0
+
+    def request(self, method, url, body=None, headers=None):
+        """Send one request and return (status, headers, body bytes)"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        connection = self.connections.pop(key, None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            connection = connection_class(parts.hostname, parts.port, timeout=self.timeout)
+            self.opened += 1
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self.connections[key] = connection
+        return response.status, dict(response.getheaders()), data
+
+    def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.connections = {}
+
+class HttpUploadClient:
+    """
+    Uploads a video in fixed-size chunks over pooled keep-alive connections.
+    A failed chunk is retried on its own, and progress is saved to
+    <video>.upload.json after every chunk, so a later attempt resumes at the
+    first chunk the server has not acknowledged instead of starting over.
+    """
+    def __init__(self, cookie_header, api_url=UPLOAD_API_URL, chunk_size=CHUNK_SIZE,
+                 max_retries=MAX_CHUNK_RETRIES, retry_delay=RETRY_DELAY, access_token=None):
+        self.cookie_header = cookie_header
+        self.api_url = api_url.rstrip("/")
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.access_token = access_token or os.getenv('TIKTOK_ACCESS_TOKEN')
+        self.pool = ConnectionPool()
+        self.retries = 0
+
+    def headers(self, extra=None):
+        headers = {'Cookie': self.cookie_header}
+        if self.access_token:
+            headers['Authorization'] = f"Bearer {self.access_token}"
+        headers.update(extra or {})
+        return headers
+
+    def chunk_count(self, video_size):
+        """TikTok folds the remainder into the last chunk instead of sending a short extra one"""
+        return max(1, video_size // self.chunk_size)
+
+    def state_path(self, video_path):
+        return video_path + ".upload.json"
+
+    def file_identity(self, video_path):
+        """Size, modification time and a hash of the first chunk: a re-rendered video of the same size differs"""
+        stat = os.stat(video_path)
+        with open(video_path, 'rb') as f:
+            head = hashlib.sha256(f.read(self.chunk_size)).hexdigest()
+        return {'video_size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'head_sha256': head}
+
+    def load_state(self, video_path, identity):
+        """Progress of an earlier attempt at the same file, if any"""
+        try:
+            with open(self.state_path(video_path), 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if state.get('chunk_size') != self.chunk_size or state.get('file') != identity:
+            return None
+        return state
+
+    def save_state(self, video_path, state):
+        temp_path = self.state_path(video_path) + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path(video_path))
+
+    def clear_state(self, video_path):
+        if os.path.exists(self.state_path(video_path)):
+            os.remove(self.state_path(video_path))
+
+    def init_upload(self, video_size, description):
+        """Register the upload and return the URL the chunks go to"""
+        chunk_count = self.chunk_count(video_size)
+        body = json.dumps({
+            'post_info': {'title': description, 'privacy_level': "PUBLIC_TO_EVERYONE"},
+            'source_info': {
+                'source': "FILE_UPLOAD",
+                'video_size': video_size,
+                'chunk_size': self.chunk_size,
+                'total_chunk_count': chunk_count
+            }
+        })
+        status, _, data = self.pool.request(
+            "POST", self.api_url + INIT_PATH, body=body,
+            headers=self.headers({'Content-Type': "application/json; charset=UTF-8"})
+        )
+        if status != 200:
+            raise UploadError(f"Upload init failed with HTTP {status}: {data[:200]!r}")
+        try:
+            response = json.loads(data)['data']
+            upload_url = response['upload_url']
+        except (ValueError, KeyError, TypeError) as e:
+            raise UploadError(f"Malformed upload init response ({e!r}): {data[:200]!r}") from e
+        return {
+            'upload_url': upload_url,
+            'publish_id': response.get('publish_id'),
+            'video_size': video_size,
+            'chunk_size': self.chunk_size,
+            'next_chunk': 0
+        }
+
+    def send_chunk(self, upload_url, chunk, start, video_size):
+        """PUT one chunk, retrying transient failures; returns the final HTTP status"""
+        end = start + len(chunk) - 1
+        headers = self.headers({
+            'Content-Type': "video/mp4",
+            'Content-Length': str(len(chunk)),
+            'Content-Range': f"bytes {start}-{end}/{video_size}"
+        })
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                status, _, data = self.pool.request("PUT", upload_url, body=chunk, headers=headers)
+                if status in (200, 201, 206):
+                    return status
+                if status in (404, 410):
+                    raise UploadExpired(f"Upload session expired (HTTP {status})")
+                if status not in RETRY_STATUSES:
+                    raise UploadError(f"Chunk at byte {start} rejected with HTTP {status}: {data[:200]!r}")
+                error = f"HTTP {status}"
+            except (OSError, http.client.HTTPException) as e:
+                error = str(e) or type(e).__name__
+            if attempt == self.max_retries:
+                break
+            self.retries += 1
+            logger.warning(f"Chunk at byte {start} failed ({error}), retrying in {delay} seconds...")
+            time.sleep(delay)
+            delay *= 2
+        raise UploadError(f"Chunk at byte {start} failed after {self.max_retries + 1} attempts: {error}")
+
+    def upload(self, video_path, description, span=None):
+        """Upload a video, resuming an earlier attempt if one was interrupted; returns the publish id"""
+        identity = self.file_identity(video_path)
+        video_size = identity['video_size']
+        state = self.load_state(video_path, identity)
+        if state:
+            logger.info(f"Resuming upload at chunk {state['next_chunk'] + 1}")
+        else:
+            state = self.init_upload(video_size, description)
+            state['file'] = identity
+            self.save_state(video_path, state)
+
+        chunk_count = self.chunk_count(video_size)
+        started = time.perf_counter()
+        sent = 0
+        try:
+            with open(video_path, 'rb') as f:
+                for index in range(state['next_chunk'], chunk_count):
+                    start = index * self.chunk_size
+                    f.seek(start)
+                    # The last chunk carries the remainder, so it may be up to twice chunk_size
+                    length = video_size - start if index == chunk_count - 1 else self.chunk_size
+                    chunk = f.read(length)
+                    status = self.send_chunk(state['upload_url'], chunk, start, video_size)
+
+                    sent += len(chunk)
+                    state['next_chunk'] = index + 1
+                    self.save_state(video_path, state)
+                    elapsed = time.perf_counter() - started
+                    logger.info(
+                        f"Uploaded chunk {index + 1}/{chunk_count} "
+                        f"({100 * (start + len(chunk)) // video_size}%, {sent / 1024**2 / max(elapsed, 1e-6):.1f} MB/s)"
+                    )
+                    if status == 201 and index < chunk_count - 1:
+                        raise UploadError("Server finished the upload before the last chunk")
+        except UploadExpired:
+            self.clear_state(video_path)
+            raise
+        finally:
+            self.pool.close()
+            if span is not None:
+                span['bytes'] = sent
+                span['retries'] = self.retries
+
+        self.clear_state(video_path)
+        return state['publish_id']
@@ -0,0 +1,197 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_uploader import HttpUploadClient, UploadError, INIT_PATH
+
+class MockUploadServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the upload API. failures maps a chunk's start byte to
+    a list of faults to inject on its next attempts: an HTTP status, or
+    "drop" to close the connection without answering.
+    """
+    def __init__(self, failures=None):
+        self.failures = {start: list(faults) for start, faults in (failures or {}).items()}
+        self.received = {}
+        self.video_size = None
+        self.init_calls = 0
+        self.chunk_requests = []
+        self.client_ports = set()
+        self.cookies = []
+        # Raw body to answer the init call with instead of a valid response
+        self.init_body = None
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), MockUploadHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def assembled(self):
+        return b"".join(self.received[start] for start in sorted(self.received))
+
+class MockUploadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.init_calls += 1
+            server.video_size = body['source_info']['video_size']
+            server.cookies.append(self.headers.get('Cookie'))
+        assert self.path == INIT_PATH
+        if server.init_body is not None:
+            self.reply(200, server.init_body)
+            return
+        self.reply(200, json.dumps({'data': {
+            'publish_id': "v_pub_1",
+            'upload_url': f"{server.url}/upload/v_pub_1"
+        }}).encode())
+
+    def do_PUT(self):
+        server = self.server
+        start, end, total = (int(n) for n in re.match(r"bytes (\d+)-(\d+)/(\d+)", self.headers['Content-Range']).groups())
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            server.client_ports.add(self.client_address[1])
+            server.chunk_requests.append(start)
+            faults = server.failures.get(start)
+            fault = faults.pop(0) if faults else None
+        if fault == "drop":
+            self.close_connection = True
+            self.connection.close()
+            return
+        if fault is not None:
+            self.reply(fault)
+            return
+        assert len(data) == end - start + 1
+        with server.lock:
+            server.received[start] = data
+            done = sum(len(chunk) for chunk in server.received.values()) == total
+        self.reply(201 if done else 206)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(failures=None):
+    server = MockUploadServer(failures)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def make_video(directory, size):
+    path = os.path.join(directory, "video.mp4")
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return path
+
+CHUNK = 64 * 1024
+
+def test_chunks_are_retried_and_connections_reused():
+    server = start_server({CHUNK: [500, "drop"], 3 * CHUNK: [503]})
+    with tempfile.TemporaryDirectory() as tmp:
+        # Five full chunks plus a remainder folded into the last one
+        video_path = make_video(tmp, 5 * CHUNK + 1000)
+        client = HttpUploadClient("sessionid=abc", api_url=server.url, chunk_size=CHUNK, retry_delay=0.01)
+        span = {'bytes': 0, 'retries': 0}
+        assert client.upload(video_path, "caption", span=span) == "v_pub_1"
+
+        with open(video_path, 'rb') as f:
+            assert server.assembled() == f.read()
+        assert span['retries'] == 3
+        assert span['bytes'] == 5 * CHUNK + 1000
+        assert server.cookies == ["sessionid=abc"]
+        # Only the dropped connection forced a reconnect
+        assert len(server.client_ports) <= 3
+        assert not os.path.exists(video_path + ".upload.json")
+    server.shutdown()
+
+def test_failed_upload_resumes_after_last_acknowledged_chunk():
+    server = start_server({2 * CHUNK: [500] * 10})
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = make_video(tmp, 4 * CHUNK)
+        client = HttpUploadClient("sessionid=abc", api_url=server.url, chunk_size=CHUNK, max_retries=2, retry_delay=0.01)
+        try:
+            client.upload(video_path, "caption")
+            assert False, "the upload should have given up on the third chunk"
+        except UploadError:
+            pass
+        assert sorted(server.received) == [0, CHUNK]
+
+        # The server recovers; a new attempt picks up at the third chunk
+        server.failures = {}
+        server.chunk_requests = []
+        client = HttpUploadClient("sessionid=abc", api_url=server.url, chunk_size=CHUNK, retry_delay=0.01)
+        client.upload(video_path, "caption")
+        assert server.init_calls == 1
+        assert server.chunk_requests == [2 * CHUNK, 3 * CHUNK]
+        with open(video_path, 'rb') as f:
+            assert server.assembled() == f.read()
+    server.shutdown()
+
+def test_rejected_chunk_is_not_retried():
+    server = start_server({0: [400]})
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = make_video(tmp, 2 * CHUNK)
+        client = HttpUploadClient("sessionid=abc", api_url=server.url, chunk_size=CHUNK, retry_delay=0.01)
+        try:
+            client.upload(video_path, "caption")
+            assert False, "a rejected chunk should fail the upload"
+        except UploadError as e:
+            assert "HTTP 400" in str(e)
+        assert server.chunk_requests == [0]
+    server.shutdown()
+
+def test_malformed_init_response_is_an_upload_error():
+    server = start_server()
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = make_video(tmp, 2 * CHUNK)
+        client = HttpUploadClient("sessionid=abc", api_url=server.url, chunk_size=CHUNK, retry_delay=0.01)
+        for body in (b"<html>Service Unavailable</html>", b'{"error": {"code": "spam_risk"}}', b'{"data": null}'):
+            server.init_body = body
+            try:
+                client.upload(video_path, "caption")
+                assert False, f"{body!r} should not start an upload"
+            except UploadError as e:
+                assert "Malformed" in str(e)
+    server.shutdown()
+
+def test_different_video_of_the_same_size_starts_over():
+    server = start_server({2 * CHUNK: [500] * 10})
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = make_video(tmp, 4 * CHUNK)
+        client = HttpUploadClient("sessionid=abc", api_url=server.url, chunk_size=CHUNK, max_retries=0, retry_delay=0.01)
+        try:
+            client.upload(video_path, "caption")
+            assert False, "the upload should have given up on the third chunk"
+        except UploadError:
+            pass
+
+        # A re-render replaces the file with new content of exactly the same size
+        server.failures = {}
+        server.received = {}
+        server.chunk_requests = []
+        video_path = make_video(tmp, 4 * CHUNK)
+        client.upload(video_path, "caption")
+        assert server.init_calls == 2
+        assert server.chunk_requests == [0, CHUNK, 2 * CHUNK, 3 * CHUNK]
+        with open(video_path, 'rb') as f:
+            assert server.assembled() == f.read()
+    server.shutdown()
+
+if __name__ == "__main__":
+    test_chunks_are_retried_and_connections_reused()
+    test_failed_upload_resumes_after_last_acknowledged_chunk()
+    test_rejected_chunk_is_not_retried()
+    test_malformed_init_response_is_an_upload_error()
+    test_different_video_of_the_same_size_starts_over()
+    print("All HTTP uploader tests passed")
@@ -1,22 +1,74 @@
 import asyncio
-from playwright.async_api import async_playwright
-import praw
-from gtts import gTTS
-from gtts.tts import gTTSError
-from moviepy.editor import VideoFileClip, CompositeVideoClip, AudioFileClip, ImageClip, concatenate_videoclips, ColorClip
-from moviepy.editor import vfx
+import argparse
+import bisect
+import html
+import io
+import json
+import multiprocessing
 import os
 import textwrap
-from PIL import Image
 import re
 import random
-import time
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
+from metrics import Metrics
+from profiling import create_profiler, profiling_requested, sampling_requested
+from series import plan_parts, part_output_path, write_manifest, load_manifest, remove_outputs, MAX_PART_SECONDS
+import render_cache
+from ratelimit import get_rate_limiter
+from comments import fetch_thread, load_cached_comments, comment_snapshot
+
+# Heavy dependencies (moviepy, numpy, PIL, playwright, praw, gTTS) are imported
+# inside the stages that use them, so importing this module stays cheap and a
+# warm worker process (see worker.py) only pays for them once.
 
 # Load environment variables from .env file
 load_dotenv()
 
+_reddit_client = None
+
+# Draft mode renders everything at a quarter of the final resolution
+DRAFT_SCALE = 0.25
+DEFAULT_OUTPUT_PATH = "output_video.mp4"
+# Narration is time-stretched by this factor without changing its pitch
+SPEED_FACTOR = 1.3
+# Silence kept between narrated chunks after trimming, in seconds
+NARRATION_GAP = 0.15
+# gTTS English narration runs at roughly 150 words per minute
+TTS_WORDS_PER_SECOND = 2.5
+TTS_LANG = 'en'
+BACKGROUND_VIDEO_PATH = "background.mp4"
+# Story mode narrates a post's text, comments mode the post followed by its top comments
+MODES = ('story', 'comments')
+DEFAULT_SUBREDDITS = {'story': "nosleep", 'comments': "AmItheAsshole"}
+# Targets a single render can write in one pass. card_y is where the card's
+# centre sits as a fraction of the height: Shorts and Reels draw their own
+# buttons and captions over the lower part of the frame, so cards sit higher.
+OUTPUT_SPECS = {
+    'tiktok': {'size': (1080, 1920), 'fps': 24, 'encode': 'final', 'card_width': 0.9, 'card_y': 0.5,
+               'watermark': 'top-left'},
+    'shorts': {'size': (1080, 1920), 'fps': 30, 'encode': 'final', 'card_width': 0.9, 'card_y': 0.42,
+               'watermark': 'top-right'},
+    'reels': {'size': (1080, 1920), 'fps': 30, 'encode': 'final', 'card_width': 0.88, 'card_y': 0.4,
+              'watermark': 'top-right'},
+    'square': {'size': (1080, 1080), 'fps': 30, 'encode': 'final', 'card_width': 0.8, 'card_y': 0.5,
+               'watermark': 'bottom-right'}
+}
+# Drawn in each output's watermark corner when the file exists
+WATERMARK_PATH = "watermark.png"
+WATERMARK_WIDTH = 0.18
+WATERMARK_MARGIN = 0.03
+
+# Bump when the card HTML changes, or when narration and compositing change
+# what a render looks or sounds like, so cached renders are not reused
+CARD_TEMPLATE_VERSION = 3
+COMPOSITION_VERSION = 2
+
+ENCODE_SETTINGS = {
+    'draft': {'fps': 12, 'codec': 'libx264', 'audio_codec': 'aac', 'preset': 'ultrafast'},
+    'final': {'fps': 24, 'codec': 'libx264', 'audio_codec': 'aac'}
+}
+
 def split_content_into_chunks(content, chunk_size=8):
     """Split content into chunks, respecting sentence boundaries when possible"""
     sentences = re.split(r'(?<=[.!?])\s+', content)
@@ -48,15 +100,160 @@ def split_content_into_chunks(content, chunk_size=8):
     
     return chunks
 
-async def capture_reddit_post(url: str, output_path: str, chunk_text: str, is_first_chunk: bool = False, post_title: str = "", author: str = "") -> None:
-    """Capture a specific chunk of the Reddit post"""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            viewport={'width': 1080, 'height': 100},  # Start with small height
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+def estimate_narration_duration(text):
+    """Estimate how long gTTS would take to read the text, in seconds"""
+    word_count = len(text.split())
+    return max(1.0, word_count / TTS_WORDS_PER_SECOND)
+
+def load_moviepy():
+    """Import moviepy.editor on first use and install the resize patch"""
+    import moviepy.editor
+    import moviepy.video.fx.resize
+    moviepy.video.fx.resize.resizer = patched_resize
+    return moviepy.editor
+
+def draft_output_path(output_path):
+    """Drafts are written beside the job's video, never over it: videos/abc.mp4 -> videos/abc_draft.mp4"""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_draft{ext}"
+
+def post_snapshot(post, comments=None):
+    """The parts of a post that end up in its video, plus the selected comments in comments mode"""
+    snapshot = {
+        'id': post.id,
+        'title': post.title,
+        'selftext': post.selftext,
+        'author': post.author.name if post.author else "[deleted]",
+        'permalink': post.permalink
+    }
+    if comments is not None:
+        snapshot['subreddit'] = post.subreddit.display_name
+        snapshot['comments'] = comments
+    return snapshot
+
+def story_chunks(snapshot):
+    """
+    The narrated chunks of a snapshot in order, as {'text', 'comment'}. In
+    comments mode the post's text is followed by each selected comment, and
+    the first chunk of a comment carries its author and score for the card.
+    """
+    chunks = [{'text': chunk, 'comment': None} for chunk in split_content_into_chunks(snapshot['selftext'])]
+    if 'comments' not in snapshot:
+        return chunks
+    # Question posts often have a title and no body
+    chunks = [chunk for chunk in chunks if chunk['text'].strip()]
+    for comment in snapshot['comments']:
+        header = {'author': comment['author'], 'score': comment['score'], 'reply': comment['depth'] > 0}
+        for j, chunk in enumerate(split_content_into_chunks(comment['body'])):
+            chunks.append({'text': chunk, 'comment': header if j == 0 else None})
+    return chunks
+
+def composition_manifest(snapshot, draft=False, series=False, max_part_seconds=MAX_PART_SECONDS,
+                         background_path=BACKGROUND_VIDEO_PATH):
+    """
+    Everything that determines a render's output. Two renders with the same
+    manifest produce the same video, so its hash keys the render cache.
+    """
+    from frame_cache import frame_cache_enabled
+    profile = 'draft' if draft else 'final'
+    return {
+        'version': COMPOSITION_VERSION,
+        'post': render_cache.manifest_hash(snapshot),
+        # Story-mode manifests keep their original shape so earlier cache entries still hit
+        'chunks': story_chunks(snapshot) if 'comments' in snapshot else split_content_into_chunks(snapshot['selftext']),
+        'card_template': CARD_TEMPLATE_VERSION,
+        'card_scale': DRAFT_SCALE if draft else 1.0,
+        'tts': {'engine': 'gtts', 'lang': TTS_LANG, 'draft_silence': draft},
+        'speed_factor': SPEED_FACTOR,
+        'narration_gap': NARRATION_GAP,
+        # The background offset is seeded from the post id, so it is fixed by the post
+        'background': {
+            **render_cache.file_fingerprint(background_path),
+            'offset_seed': snapshot['id'],
+            # The frame cache scales with ffmpeg, the fallback with MoviePy's PIL resize; their pixels differ
+            'scaler': 'ffmpeg' if frame_cache_enabled() else 'moviepy'
+        },
+        'encode': {'profile': profile, **ENCODE_SETTINGS[profile]},
+        'series': {'max_part_seconds': max_part_seconds} if series else None
+    }
+
+def get_reddit_client():
+    """Create the Reddit client once per process"""
+    global _reddit_client
+    if _reddit_client is None:
+        import praw
+        _reddit_client = praw.Reddit(
+            client_id=os.getenv('REDDIT_CLIENT_ID'),
+            client_secret=os.getenv('REDDIT_CLIENT_SECRET'),
+            user_agent=os.getenv('REDDIT_USER_AGENT')
         )
-        
+    return _reddit_client
+
+def warm_up():
+    """Import every heavy dependency so the first stage of a job starts immediately"""
+    load_moviepy()
+    import numpy
+    import PIL.Image
+    import gtts
+    import praw
+    import playwright.async_api
+    from audio import get_ffmpeg_binary
+    get_ffmpeg_binary()
+
+def make_silent_audio(duration, fps=44100):
+    """Create a silent stereo audio clip of the given duration"""
+    import numpy as np
+    mpy = load_moviepy()
+    
+    def make_frame(t):
+        if isinstance(t, np.ndarray):
+            return np.zeros((len(t), 2))
+        return [0, 0]
+    return mpy.AudioClip(make_frame, duration=duration, fps=fps)
+
+class CardRenderer:
+    """Keeps one headless Chromium running so every card reuses it instead of launching its own"""
+    def __init__(self):
+        self.playwright = None
+        self.browser = None
+    
+    async def start(self):
+        from playwright.async_api import async_playwright
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=True)
+        return self
+    
+    async def close(self):
+        if self.browser:
+            await self.browser.close()
+            self.browser = None
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+async def capture_reddit_post(url: str, output_path: str, chunk_text: str, is_first_chunk: bool = False, post_title: str = "", author: str = "", scale: float = 1.0, browser=None, part_label: str = "", subreddit: str = "nosleep", comment: dict = None) -> bytes:
+    """
+    Capture a specific chunk of the Reddit post, returning the PNG bytes (also saved if output_path is set).
+    A chunk that opens a comment gets a comment header with its author and score.
+    """
+    if browser is None:
+        # No warm browser given, so launch one just for this card
+        from playwright.async_api import async_playwright
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            try:
+                return await capture_reddit_post(url, output_path, chunk_text, is_first_chunk,
+                                                 post_title, author, scale, browser=browser,
+                                                 part_label=part_label, subreddit=subreddit, comment=comment)
+            finally:
+                await browser.close()
+    
+    context = await browser.new_context(
+        viewport={'width': 1080, 'height': 100},  # Start with small height
+        device_scale_factor=scale,  # Draft mode captures cards at reduced resolution
+        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    )
+    try:
         page = await context.new_page()
         
         html_content = f"""
@@ -93,6 +290,16 @@ async def capture_reddit_post(url: str, output_path: str, chunk_text: str, is_fi
                     font-size: 20px;
                     padding-bottom: 15px;
                 }}
+                .part-label {{
+                    display: inline-block;
+                    background-color: #ff4500;
+                    color: #ffffff;
+                    font-size: 22px;
+                    font-weight: bold;
+                    padding: 6px 14px;
+                    border-radius: 14px;
+                    margin-bottom: 15px;
+                }}
                 .author {{
                     color: #818384;
                     font-size: 18px;
@@ -108,20 +315,46 @@ async def capture_reddit_post(url: str, output_path: str, chunk_text: str, is_fi
                     font-size: 24px;
                     line-height: 1.6;
                 }}
+                .comment {{
+                    border-left: 4px solid #343536;
+                    padding-left: 20px;
+                }}
+                .comment.reply {{
+                    margin-left: 30px;
+                }}
+                .comment-header {{
+                    font-size: 18px;
+                    padding-bottom: 12px;
+                }}
+                .comment-author {{
+                    color: #4fbcff;
+                    font-weight: bold;
+                }}
+                .comment-score {{
+                    color: #818384;
+                }}
             </style>
         </head>
         <body>
             <div class="post-container">
-                {'''<div class="subreddit">r/nosleep</div>''' if is_first_chunk else ''}
-                {f'''<div class="author">Posted by u/{author}</div>''' if is_first_chunk else ''}
-                {f'''<div class="title">{post_title}</div>''' if is_first_chunk else ''}
-                <div class="content">{chunk_text}</div>
+                {f'''<div class="part-label">{part_label}</div>''' if part_label else ''}
+                {f'''<div class="subreddit">r/{card_text(subreddit)}</div>''' if is_first_chunk else ''}
+                {f'''<div class="author">Posted by u/{card_text(author)}</div>''' if is_first_chunk else ''}
+                {f'''<div class="title">{card_text(post_title)}</div>''' if is_first_chunk else ''}
+                {f'''<div class="comment{' reply' if comment['reply'] else ''}">
+                    <div class="comment-header">
+                        <span class="comment-author">u/{card_text(comment['author'])}</span>
+                        <span class="comment-score">&middot; {comment['score']} points</span>
+                    </div>
+                    <div class="content">{card_text(chunk_text)}</div>
+                </div>''' if comment else f'''<div class="content">{card_text(chunk_text)}</div>'''}
             </div>
         </body>
         </html>
         """
         
         await page.set_content(html_content)
+        png_bytes = None
         
         # Get the exact height of the content
         content_element = await page.query_selector('.post-container')
@@ -138,16 +371,29 @@ async def capture_reddit_post(url: str, output_path: str, chunk_text: str, is_fi
                 })
                 
                 # Take screenshot
-                await page.screenshot(path=output_path)
+                png_bytes = await page.screenshot(path=output_path)
         else:
             raise Exception("Could not find post content")
         
-        await browser.close()
+        return png_bytes
+    finally:
+        await context.close()
+
+def card_text(text):
+    """
+    Escape Reddit text for the card HTML. The API already entity-encodes
+    &, < and > in post and comment bodies, so they are decoded first to
+    avoid showing a literal &amp;.
+    """
+    return html.escape(html.unescape(str(text)))
 
 def patched_resize(im, newsize):
     """
     Custom resize function that handles both PIL Images and numpy arrays
     """
+    import numpy as np
+    from PIL import Image
+    
     # If input is numpy array, convert to PIL Image
     if isinstance(im, np.ndarray):
         pil_im = Image.fromarray(im)
@@ -184,169 +430,623 @@ def patched_resize(im, newsize):
         return np.array(resized)
     return resized
 
-# Monkey patch the resize function
-import moviepy.video.fx.resize
-moviepy.video.fx.resize.resizer = patched_resize
-
-def create_video_clips(chunk_images, audio_clips, background_video_path, output_size=(1080, 1920), speed_factor=1.3):
-    """Create video clips with a single continuous background and faster audio"""
-    # Calculate total duration after speed adjustment
-    total_duration = sum(audio.duration / speed_factor for audio in audio_clips)
-    
-    # Load the background video
-    background = VideoFileClip(background_video_path)
-    
-    # Get a random start time that allows for the full duration
-    max_start = max(0, background.duration - total_duration)
-    start_time = random.uniform(0, max_start)
-    
-    # Extract the segment we need for the entire video
-    background_segment = background.subclip(start_time, start_time + total_duration)
+def create_video_clips(chunk_images, chunk_times, background_video_path, output_size=(1080, 1920), seed=None):
+    """
+    Create video clips with a single continuous background, timed to the
+    narration track. The background offset is drawn from random.Random(seed),
+    so the same seed always picks the same footage.
+    """
+    import numpy as np
+    from frame_cache import open_frame_cache, frame_cache_clip
+    mpy = load_moviepy()
     
-    # Calculate dimensions for background resize
-    target_height = output_size[1]
-    height_scale = target_height / background.h
-    target_width = int(background.w * height_scale)
+    # The narration track is already sped up, so its chunk boundaries give the timeline
+    total_duration = chunk_times[-1][1]
     
-    # Resize background to fit height while maintaining aspect ratio
-    background_segment = background_segment.resize(height=target_height)
+    cache = open_frame_cache(background_video_path, output_size)
+    if cache is not None:
+        # Frames come pre-scaled and cropped to the output size from the host-wide cache,
+        # shared with re-renders of the same post that read the same stretch of background
+        max_start = max(0, cache.duration - total_duration)
+        start_time = random.Random(seed).uniform(0, max_start)
+        background_segment = frame_cache_clip(cache, start_time, total_duration)
+        target_width = output_size[0]
+    else:
+        # Load the background video
+        background = mpy.VideoFileClip(background_video_path)
+        
+        # Get a random start time that allows for the full duration
+        max_start = max(0, background.duration - total_duration)
+        start_time = random.Random(seed).uniform(0, max_start)
+        
+        # Extract the segment we need for the entire video
+        background_segment = background.subclip(start_time, start_time + total_duration)
+        
+        # Calculate dimensions for background resize
+        target_height = output_size[1]
+        height_scale = target_height / background.h
+        target_width = int(background.w * height_scale)
+        
+        # Resize background to fit height while maintaining aspect ratio
+        background_segment = background_segment.resize(height=target_height)
     
     clips = []
-    current_time = 0
     
     # Create clips for each chunk
-    for screenshot_path, audio_clip in zip(chunk_images, audio_clips):
-        # Speed up the audio using the correct method
-        faster_audio = audio_clip.fx(vfx.speedx, speed_factor)
+    for chunk_image, (chunk_start, chunk_end) in zip(chunk_images, chunk_times):
+        chunk_duration = chunk_end - chunk_start
+        
+        # Cards are opaque, so drop the alpha channel of in-memory RGBA buffers
+        if isinstance(chunk_image, np.ndarray) and chunk_image.shape[2] == 4:
+            chunk_image = chunk_image[:, :, :3]
         
         # Load and prepare the screenshot
-        screenshot = (ImageClip(screenshot_path)
-                     .set_duration(faster_audio.duration)
+        screenshot = (mpy.ImageClip(chunk_image)
+                     .set_duration(chunk_duration)
                      .resize(width=int(output_size[0] * 0.9))  # Make screenshot slightly smaller than video width
                      .set_position(('center', 'center')))
         
         # Cut the corresponding portion of background video
-        chunk_background = background_segment.subclip(current_time, current_time + faster_audio.duration)
+        chunk_background = background_segment.subclip(chunk_start, chunk_end)
         
         # Center the background video
         x_offset = (output_size[0] - target_width) // 2
         chunk_background = chunk_background.set_position((x_offset, 0))
         
         # Create black background
-        black_bg = ColorClip(size=output_size, color=(0, 0, 0)).set_duration(faster_audio.duration)
+        black_bg = mpy.ColorClip(size=output_size, color=(0, 0, 0)).set_duration(chunk_duration)
         
         # Combine background and screenshot for this chunk
-        chunk_clip = CompositeVideoClip([
+        chunk_clip = mpy.CompositeVideoClip([
             black_bg,           # Black background layer
             chunk_background,   # Video background layer
             screenshot         # Screenshot on top
         ], size=output_size)
         
-        # Add sped-up audio
-        chunk_clip = chunk_clip.set_audio(faster_audio)
         clips.append(chunk_clip)
-        
-        current_time += faster_audio.duration
     
     return clips
 
-async def create_tts_with_retry(text, output_path, max_retries=5, initial_delay=1):
-    """Create TTS audio with retry logic and exponential backoff"""
+def output_spec(entry, draft=False):
+    """
+    Resolve one requested output to (name, spec). entry is an OUTPUT_SPECS
+    name, or a caller-supplied dict with a 'name' and any spec keys, which
+    override the preset named by its 'base' (default tiktok). The spec is
+    scaled down to draft resolution and speed if needed.
+    """
+    if isinstance(entry, str):
+        if entry not in OUTPUT_SPECS:
+            raise ValueError(f"Unknown output: {entry}")
+        name, spec = entry, dict(OUTPUT_SPECS[entry])
+    else:
+        if not entry.get('name'):
+            raise ValueError(f"Output spec needs a name: {entry}")
+        base = entry.get('base', 'tiktok')
+        if base not in OUTPUT_SPECS:
+            raise ValueError(f"Unknown base output: {base}")
+        name = entry['name']
+        spec = {**OUTPUT_SPECS[base], **{k: v for k, v in entry.items() if k not in ('name', 'base')}}
+        # libx264 needs even dimensions
+        spec['size'] = tuple(int(side) // 2 * 2 for side in spec['size'])
+        if spec['encode'] not in ENCODE_SETTINGS:
+            raise ValueError(f"Unknown encode profile: {spec['encode']}")
+    if draft:
+        # libx264 needs even dimensions
+        spec['size'] = tuple(int(side * DRAFT_SCALE) // 2 * 2 for side in spec['size'])
+        spec['fps'] = min(spec['fps'], ENCODE_SETTINGS['draft']['fps'])
+        spec['encode'] = 'draft'
+    return name, spec
+
+def corner_position(corner, canvas_size, item_size, margin):
+    """Top-left pixel of an item placed in a named corner of the canvas"""
+    vertical, horizontal = corner.split('-')
+    x = margin if horizontal == 'left' else canvas_size[0] - item_size[0] - margin
+    y = margin if vertical == 'top' else canvas_size[1] - item_size[1] - margin
+    return x, y
+
+def render_outputs(chunk_images, chunk_times, narration, background_video_path, targets, seed=None):
+    """
+    Write several variants of the same story in one pass. targets is a list
+    of (spec, output_path). Each background frame is decoded once and
+    scaled once per distinct output size. Every card is fitted once per
+    output, and the narration is encoded to AAC once and muxed into every
+    file as is. Only the compositing and the encoders run per output.
+    """
+    import heapq
+    import numpy as np
+    from PIL import Image
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+    mpy = load_moviepy()
+    
+    total_duration = chunk_times[-1][1]
+    chunk_starts = [start for start, _ in chunk_times]
+    
+    background = mpy.VideoFileClip(background_video_path, audio=False)
+    # Same seeded offset as create_video_clips, so every output shows the same footage
+    max_start = max(0, background.duration - total_duration)
+    start_time = random.Random(seed).uniform(0, max_start)
+    source_w, source_h = background.size
+    
+    audio_path = os.path.splitext(targets[0][1])[0] + ".narration.m4a"
+    narration.write_audiofile(audio_path, fps=44100, codec='aac', logger=None)
+    
+    watermark = None
+    if os.path.exists(WATERMARK_PATH):
+        watermark = Image.open(WATERMARK_PATH).convert('RGBA')
+    
+    outputs = []
+    for spec, path in targets:
+        width, height = spec['size']
+        encode = ENCODE_SETTINGS[spec['encode']]
+        
+        # Cards are opaque, fitted to the spec's width without running off the frame
+        cards = []
+        for chunk_image in chunk_images:
+            # Cards the artifact store spilled to disk arrive as PNG paths
+            if isinstance(chunk_image, str):
+                card = Image.open(chunk_image).convert('RGB')
+            else:
+                card = Image.fromarray(np.asarray(chunk_image)[:, :, :3])
+            scale = min(width * spec['card_width'] / card.width, height * 0.9 / card.height)
+            card = card.resize((int(card.width * scale), int(card.height * scale)), Image.Resampling.LANCZOS)
+            x = (width - card.width) // 2
+            y = min(max(0, int(height * spec['card_y'] - card.height / 2)), height - card.height)
+            cards.append((np.asarray(card), x, y))
+        
+        mark = None
+        if watermark is not None and spec.get('watermark'):
+            mark_width = int(width * WATERMARK_WIDTH)
+            resized = watermark.resize((mark_width, int(watermark.height * mark_width / watermark.width)),
+                                       Image.Resampling.LANCZOS)
+            pixels = np.asarray(resized).astype(np.float32)
+            x, y = corner_position(spec['watermark'], spec['size'], resized.size, int(width * WATERMARK_MARGIN))
+            mark = (pixels[:, :, :3], pixels[:, :, 3:] / 255.0, x, y)
+        
+        writer = FFMPEG_VideoWriter(
+            path, spec['size'], spec['fps'],
+            codec=encode['codec'],
+            preset=encode.get('preset', 'medium'),
+            audiofile=audio_path
+        )
+        outputs.append({'spec': spec, 'path': path, 'cards': cards, 'watermark': mark, 'writer': writer,
+                        'frames': int(total_duration * spec['fps'])})
+    
+    def frame_times(index):
+        output = outputs[index]
+        return ((frame / output['spec']['fps'], index) for frame in range(output['frames']))
+    
+    last_frame = None
+    scaled = {}
+    total_frames = sum(output['frames'] for output in outputs)
+    try:
+        # Walk every output's frame times in order, so the background is read sequentially
+        for written, (t, index) in enumerate(heapq.merge(*(frame_times(i) for i in range(len(outputs))))):
+            output = outputs[index]
+            width, height = output['spec']['size']
+            
+            frame = background.get_frame(start_time + t)
+            # The reader hands back the same array while t stays within one source frame
+            if frame is not last_frame:
+                last_frame = frame
+                scaled = {}
+            if (width, height) not in scaled:
+                # Fit the height and crop the centre, or pad with black if the source is too narrow
+                scale = height / source_h
+                crop_w = width / scale
+                source = Image.fromarray(frame)
+                if crop_w <= source_w:
+                    left = (source_w - crop_w) / 2
+                    scaled[(width, height)] = np.asarray(source.resize(
+                        (width, height), Image.Resampling.BILINEAR, box=(left, 0, left + crop_w, source_h)
+                    ))
+                else:
+                    fitted = np.asarray(source.resize((int(source_w * scale), height), Image.Resampling.BILINEAR))
+                    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+                    x = (width - fitted.shape[1]) // 2
+                    canvas[:, x:x + fitted.shape[1]] = fitted
+                    scaled[(width, height)] = canvas
+            
+            image = scaled[(width, height)].copy()
+            card, x, y = output['cards'][max(0, bisect.bisect_right(chunk_starts, t) - 1)]
+            image[y:y + card.shape[0], x:x + card.shape[1]] = card
+            if output['watermark'] is not None:
+                pixels, alpha, x, y = output['watermark']
+                region = image[y:y + pixels.shape[0], x:x + pixels.shape[1]]
+                region[:] = (region * (1 - alpha) + pixels * alpha).astype(np.uint8)
+            output['writer'].write_frame(image)
+            
+            if written % max(1, total_frames // 10) == 0:
+                print(f"Writing {len(outputs)} outputs: {100 * written // total_frames}%")
+    finally:
+        for output in outputs:
+            output['writer'].close()
+        background.close()
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+    
+    return [output['path'] for output in outputs]
+
+def render_part(spec):
+    """
+    Compose and encode one part of a series. Runs in its own process, so
+    spec only holds picklable values: card arrays, the part's slice of the
+    narration timeline and the encode settings.
+    """
+    mpy = load_moviepy()
+    
+    # Shift the part's chunk times so the part starts at zero
+    offset = spec['chunk_times'][0][0]
+    chunk_times = [(start - offset, end - offset) for start, end in spec['chunk_times']]
+    duration = chunk_times[-1][1]
+    
+    narration_source = None
+    if spec['narration_path']:
+        narration_source = mpy.AudioFileClip(spec['narration_path'])
+        narration = narration_source.subclip(offset, offset + duration)
+    else:
+        narration = make_silent_audio(duration)
+    
+    clips = create_video_clips(spec['images'], chunk_times, spec['background_path'],
+                               output_size=spec['output_size'], seed=spec['seed'])
+    final_clip = mpy.concatenate_videoclips(clips).set_audio(narration)
+    final_clip.write_videofile(spec['output_path'], logger=None, **spec['encode'])
+    
+    final_clip.close()
+    for clip in clips:
+        clip.close()
+    if narration_source:
+        narration_source.close()
+    return spec['output_path'], duration
+
+def render_series(specs):
+    """Render every part in parallel, one process per part up to the CPU count"""
+    workers = min(len(specs), os.cpu_count() or 1)
+    # Spawn rather than fork: the parent holds Playwright's threads and event loop
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(render_part, specs))
+
+async def create_tts_with_retry(text, output_path=None, max_retries=5, initial_delay=1, span=None):
+    """
+    Create TTS audio, returning the MP3 bytes. Requests are paced by the
+    host-wide gTTS bucket, and a 429 backs off every process sharing it.
+    """
+    from gtts import gTTS
+    from gtts.tts import gTTSError
+    
+    limiter = get_rate_limiter()
     delay = initial_delay
     for attempt in range(max_retries):
+        waited = await limiter.acquire_async('gtts')
+        if span is not None:
+            span['rate_limit_wait'] = span.get('rate_limit_wait', 0) + waited
         try:
-            tts = gTTS(text=text, lang='en')
-            tts.save(output_path)
-            # Add a small delay after successful request
-            time.sleep(1)
-            return True
+            tts = gTTS(text=text, lang=TTS_LANG)
+            audio_buffer = io.BytesIO()
+            tts.write_to_fp(audio_buffer)
+            mp3_bytes = audio_buffer.getvalue()
+            if output_path:
+                with open(output_path, 'wb') as f:
+                    f.write(mp3_bytes)
+            return mp3_bytes
         except gTTSError as e:
             if "429" in str(e) and attempt < max_retries - 1:
-                print(f"Rate limited, waiting {delay} seconds before retry...")
-                time.sleep(delay)
+                print(f"Rate limited, backing off every gTTS caller by {delay} seconds...")
+                if span is not None:
+                    span['retries'] += 1
+                # The next acquire waits out the shared backoff
+                limiter.throttled('gtts', retry_after=delay)
                 delay *= 2  # Exponential backoff
                 continue
             raise e
 
-async def create_video():
+async def create_video(draft=False, profile=False, profile_sample=False, job_id=None, renderer=None,
+                       post_id=None, output_path=None, series=False, max_part_seconds=MAX_PART_SECONDS,
+                       outputs=None, mode="story", subreddit=None):
+    """
+    Create a video for the top post, or for post_id if given. A warm worker
+    passes its own job id and running CardRenderer; otherwise a renderer is
+    started for this job only. In series mode a story longer than
+    max_part_seconds becomes several part videos plus a series manifest.
+    outputs lists OUTPUT_SPECS names or custom spec dicts (see output_spec)
+    to write in one pass, each to <output>_<name>.mp4, instead of the single
+    default video. Comments mode
+    narrates the post and then its top comments, from subreddit (default
+    per DEFAULT_SUBREDDITS).
+    """
+    import numpy as np
+    from audio import build_narration
+    from artifacts import ArtifactStore
+    
+    metrics = Metrics(job_id=job_id)
+    # Profiling is off unless asked for, in which case every metrics span is also profiled
+    profile_sample = profile_sample or sampling_requested()
+    metrics.profiler = create_profiler(
+        metrics.job_id,
+        enabled=profile or profile_sample or profiling_requested(),
+        sample=profile_sample
+    )
+    if series and outputs:
+        raise ValueError("Series mode and multiple outputs cannot be combined")
+    # Resolved up front so a bad spec fails before any fetching or rendering
+    output_specs = [output_spec(entry, draft) for entry in outputs or []]
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode}")
+    subreddit = subreddit or DEFAULT_SUBREDDITS[mode]
+    owns_renderer = renderer is None
+    artifacts = None
     try:
         print("Starting video creation process...")
         
-        reddit = praw.Reddit(
-            client_id=os.getenv('REDDIT_CLIENT_ID'),
-            client_secret=os.getenv('REDDIT_CLIENT_SECRET'),
-            user_agent=os.getenv('REDDIT_USER_AGENT')
-        )
+        output_path = output_path or DEFAULT_OUTPUT_PATH
+        if draft:
+            print("Draft mode: quarter resolution, estimated durations, no TTS")
+            output_size = (int(1080 * DRAFT_SCALE), int(1920 * DRAFT_SCALE))
+            output_path = draft_output_path(output_path)
+        else:
+            output_size = (1080, 1920)
         
-        subreddit = reddit.subreddit("nosleep")
-        for post in subreddit.hot(limit=10):
-            if not post.stickied:
-                break
+        if owns_renderer:
+            renderer = await CardRenderer().start()
+        
+        with metrics.span("fetch") as span:
+            import prawcore
+            reddit = get_reddit_client()
+            span['rate_limit_wait'] = await get_rate_limiter().acquire_async('reddit')
+            
+            try:
+                records = None
+                if post_id and mode == "comments":
+                    # The post and its depth-capped comments come back in one request
+                    post, records = fetch_thread(reddit, post_id)
+                elif post_id:
+                    post = reddit.submission(id=post_id)
+                    # Submissions are lazy; reading an attribute fetches it inside this span
+                    post.title
+                else:
+                    for post in reddit.subreddit(subreddit).hot(limit=10):
+                        if not post.stickied:
+                            break
+                
+                comments = None
+                if mode == "comments":
+                    # A cached selection keeps retries on the same comments and saves the request
+                    comments = load_cached_comments(post.id)
+                    if comments is None:
+                        if records is None:
+                            span['rate_limit_wait'] += await get_rate_limiter().acquire_async('reddit')
+                            _, records = fetch_thread(reddit, post.id)
+                        comments = comment_snapshot(post.id, records)
+                    span['comments'] = len(comments)
+            except prawcore.exceptions.TooManyRequests:
+                get_rate_limiter().throttled('reddit')
+                raise
         
         print(f"Creating video for post: {post.title[:50]}...")
+        metrics.post_id = post.id
+        
+        # Chunk artifacts stay in memory and only spill to a private job directory
+        artifacts = ArtifactStore(job_id=post.id)
         
-        if not os.path.exists("temp"):
-            os.makedirs("temp")
+        snapshot = post_snapshot(post, comments)
+        # The post's own subreddit, which --post-id or --subreddit may have made something other than nosleep
+        card_subreddit = post.subreddit.display_name
+        if comments is not None:
+            print(f"Narrating {len(comments)} comments from r/{card_subreddit}")
         
         print("Splitting content into chunks...")
-        content_chunks = split_content_into_chunks(post.selftext)
+        with metrics.span("chunk"):
+            chunks = story_chunks(snapshot)
+            content_chunks = [chunk['text'] for chunk in chunks]
+        if not content_chunks:
+            # A question post with no body and no comments worth reading would render an empty narration
+            raise ValueError(f"Nothing to narrate for post {post.id}: no body and no narratable comments")
+        
+        # An unchanged composition (e.g. a retry after a failed upload) reuses the cached render
+        with metrics.span("render_cache") as span:
+            composition = composition_manifest(snapshot, draft, series, max_part_seconds)
+            render_key = render_cache.manifest_hash(composition)
+            # Multi-output renders are not cached
+            if not outputs and render_cache.restore(render_key, output_path):
+                span['cache_hits'] = 1
+        if span['cache_hits']:
+            print(f"Render cache hit ({render_key[:12]}), skipping render. Check {output_path}")
+            return
+        # Earlier outputs may be hard links into the cache, so never write through them,
+        # but remember which parts of an earlier series render were already uploaded
+        previous_series = load_manifest(output_path)
+        remove_outputs(output_path)
         
         chunk_images = []
-        audio_clips = []
+        chunk_audio = []
+        estimated_durations = []
         
         # First, create all chunks and audio
         for i, chunk in enumerate(content_chunks):
             print(f"Processing chunk {i+1}/{len(content_chunks)}...")
             
             # Create image
-            chunk_image_path = f"temp/chunk_{i}.png"
-            await capture_reddit_post(
-                f"https://www.reddit.com{post.permalink}",
-                chunk_image_path,
-                chunk,
-                is_first_chunk=(i == 0),
-                post_title=post.title,
-                author=post.author.name if post.author else "[deleted]"
-            )
-            chunk_images.append(chunk_image_path)
+            with metrics.span("render_card", chunk=i) as span:
+                png_bytes = await capture_reddit_post(
+                    f"https://www.reddit.com{post.permalink}",
+                    None,
+                    chunk,
+                    is_first_chunk=(i == 0),
+                    post_title=post.title,
+                    author=post.author.name if post.author else "[deleted]",
+                    scale=DRAFT_SCALE if draft else 1.0,
+                    browser=renderer.browser,
+                    subreddit=card_subreddit,
+                    comment=chunks[i]['comment']
+                )
+                span['bytes'] = len(png_bytes)
+            artifacts.put_image(f"chunk_{i}", png_bytes)
+            chunk_images.append(artifacts.get_image(f"chunk_{i}"))
             
-            # Create audio with retry logic
-            chunk_audio_path = f"temp/chunk_{i}.mp3"
             narration_text = post.title + ". " + chunk if i == 0 else chunk
             
+            if draft:
+                # Skip TTS entirely and use silence of the estimated length
+                estimated_durations.append(estimate_narration_duration(narration_text) / SPEED_FACTOR)
+                continue
+            
             # Try to create TTS with retry logic
-            await create_tts_with_retry(narration_text, chunk_audio_path)
-            audio_clips.append(AudioFileClip(chunk_audio_path))
+            with metrics.span("tts", chunk=i) as span:
+                mp3_bytes = await create_tts_with_retry(narration_text, span=span)
+                span['bytes'] = len(mp3_bytes)
+            artifacts.put_audio(f"chunk_{i}", mp3_bytes)
+            # Spilled chunks stay on disk as paths for build_narration to decode
+            chunk_audio.append(artifacts.get_audio(f"chunk_{i}"))
+        
+        if draft:
+            edges = np.cumsum([0] + estimated_durations)
+            chunk_times = list(zip(edges[:-1], edges[1:]))
+            narration = make_silent_audio(edges[-1])
+        else:
+            print("Building narration track...")
+            with metrics.span("narration"):
+                narration_path = artifacts.path_for("narration.wav")
+                chunk_times, seconds_saved = build_narration(
+                    chunk_audio, narration_path, speed_factor=SPEED_FACTOR, gap=NARRATION_GAP
+                )
+            print(f"Silence trimming saved {seconds_saved:.1f} seconds")
+            narration = load_moviepy().AudioFileClip(narration_path)
+        
+        if outputs:
+            root, ext = os.path.splitext(output_path)
+            targets = [(spec, f"{root}_{name}{ext}") for name, spec in output_specs]
+            print(f"Rendering {len(targets)} outputs in one pass...")
+            with metrics.span("encode", outputs=len(targets)) as span:
+                paths = render_outputs(chunk_images, chunk_times, narration, BACKGROUND_VIDEO_PATH, targets, seed=post.id)
+                span['bytes'] = sum(os.path.getsize(path) for path in paths)
+            print(f"Video creation complete! Check {', '.join(paths)}")
             
-            # Add a delay between chunks to avoid rate limiting
-            time.sleep(2)
+            narration.close()
+            return
         
-        print("Creating video with background...")
-        clips = create_video_clips(chunk_images, audio_clips, "background.mp4")
+        encode = ENCODE_SETTINGS['draft' if draft else 'final']
+        parts = plan_parts(chunk_times, max_part_seconds) if series else []
+        if len(parts) > 1:
+            print(f"Splitting story into {len(parts)} parts of at most {max_part_seconds} seconds...")
+            
+            # Part boundaries depend on the narration length, so each part's
+            # opening card is rendered again with the title and its label
+            for k, (first, _) in enumerate(parts):
+                with metrics.span("render_card", chunk=first) as span:
+                    png_bytes = await capture_reddit_post(
+                        f"https://www.reddit.com{post.permalink}",
+                        None,
+                        content_chunks[first],
+                        is_first_chunk=True,
+                        post_title=post.title,
+                        author=post.author.name if post.author else "[deleted]",
+                        scale=DRAFT_SCALE if draft else 1.0,
+                        browser=renderer.browser,
+                        part_label=f"Part {k+1}/{len(parts)}",
+                        subreddit=card_subreddit,
+                        comment=chunks[first]['comment']
+                    )
+                    span['bytes'] = len(png_bytes)
+                artifacts.put_image(f"chunk_{first}", png_bytes)
+                chunk_images[first] = artifacts.get_image(f"chunk_{first}")
+            
+            specs = [{
+                'images': chunk_images[first:end],
+                'chunk_times': chunk_times[first:end],
+                'narration_path': None if draft else narration_path,
+                'background_path': BACKGROUND_VIDEO_PATH,
+                'output_size': output_size,
+                'seed': f"{post.id}:{k + 1}",
+                'encode': encode,
+                'output_path': part_output_path(output_path, k + 1)
+            } for k, (first, end) in enumerate(parts)]
+            
+            print("Rendering parts in parallel...")
+            with metrics.span("encode", parts=len(parts)) as span:
+                rendered = render_series(specs)
+                span['bytes'] = sum(os.path.getsize(path) for path, _ in rendered)
+            
+            write_manifest(output_path, post.id, post.title, rendered, previous=previous_series)
+            render_cache.store(render_key, output_path, composition)
+            print(f"Series complete! Check {', '.join(path for path, _ in rendered)}")
+            
+            narration.close()
+            return
         
-        print("Assembling final video...")
-        final_clip = concatenate_videoclips(clips)
+        print("Creating video with background...")
+        with metrics.span("compose"):
+            clips = create_video_clips(chunk_images, chunk_times, BACKGROUND_VIDEO_PATH,
+                                       output_size=output_size, seed=post.id)
+            
+            print("Assembling final video...")
+            final_clip = load_moviepy().concatenate_videoclips(clips).set_audio(narration)
         
         print("Saving video...")
-        final_clip.write_videofile(
-            "output_video.mp4",
-            fps=24,
-            codec='libx264',
-            audio_codec='aac'
-        )
+        with metrics.span("encode") as span:
+            final_clip.write_videofile(output_path, **encode)
+            span['bytes'] = os.path.getsize(output_path)
+        render_cache.store(render_key, output_path, composition)
         
-        print("Video creation complete! Check output_video.mp4")
+        print(f"Video creation complete! Check {output_path}")
         
         # Cleanup
         final_clip.close()
         for clip in clips:
             clip.close()
-        for audio in audio_clips:
-            audio.close()
+        narration.close()
         
     except Exception as e:
         print(f"Error during video creation: {e}")
         raise e
+    finally:
+        # Spilled artifacts live in /dev/shm, so a failed job must not leave them behind
+        if artifacts is not None:
+            artifacts.cleanup()
+        if renderer is not None and owns_renderer:
+            await renderer.close()
+        profile_summary = metrics.profiler.finish()
+        if profile_summary:
+            print(f"Profiles written to {metrics.profiler.output_dir}")
+            print(profile_summary)
 
 if __name__ == "__main__":
-    asyncio.run(create_video())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create a TikTok video from the top r/nosleep post, or a post's top comments")
+    parser.add_argument("--draft", action="store_true",
+                        help="Render a fast low-resolution preview beside the output, as <output>_draft.mp4")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write per-stage cProfile and collapsed-stack files to profiles/<job_id>")
+    parser.add_argument("--profile-sample", action="store_true",
+                        help="Also sample call stacks from a background thread (implies --profile)")
+    parser.add_argument("--post-id", help="Render this post instead of the current top post")
+    parser.add_argument("--output", help=f"Where to write the video (default: {DEFAULT_OUTPUT_PATH})")
+    parser.add_argument("--series", action="store_true",
+                        help="Split long stories into parts, written as <output>_partN.mp4 plus a series manifest")
+    parser.add_argument("--max-part-seconds", type=float, default=MAX_PART_SECONDS,
+                        help=f"Longest a part may run in series mode (default: {MAX_PART_SECONDS})")
+    parser.add_argument("--outputs", nargs="+", choices=list(OUTPUT_SPECS),
+                        help="Write these platform variants in one pass, as <output>_<name>.mp4")
+    parser.add_argument("--output-specs",
+                        help="JSON file with a list of custom outputs, each a 'name' plus OUTPUT_SPECS keys "
+                             "overriding the preset named by 'base' (default: tiktok)")
+    parser.add_argument("--mode", choices=MODES, default="story",
+                        help="story narrates the post, comments narrates the post and its top comments")
+    parser.add_argument("--subreddit",
+                        help="Subreddit to take the top post from (default: nosleep, AmItheAsshole in comments mode)")
+    args = parser.parse_args()
+    outputs = list(args.outputs or [])
+    if args.output_specs:
+        with open(args.output_specs, 'r') as f:
+            outputs += json.load(f)
+    if args.series and outputs:
+        parser.error("--series and --outputs cannot be combined")
+    asyncio.run(create_video(
+        draft=args.draft,
+        profile=args.profile,
+        profile_sample=args.profile_sample,
+        post_id=args.post_id,
+        output_path=args.output,
+        series=args.series,
+        max_part_seconds=args.max_part_seconds,
+        outputs=outputs or None,
+        mode=args.mode,
+        subreddit=args.subreddit
+    ))
\ No newline at end of file
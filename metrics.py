@@ -0,0 +1,157 @@
+import fcntl
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+METRICS_JSONL_PATH = "metrics.jsonl"
+METRICS_PROM_PATH = "metrics.prom"
+# Histogram buckets for stage wall time, in seconds
+WALL_TIME_BUCKETS = [0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800]
+
+class Metrics:
+    """
+    Records a timing span for every pipeline stage and exports them as JSON
+    lines plus a Prometheus textfile. Spans are keyed by job id and post id,
+    which child processes inherit through PIPELINE_JOB_ID / PIPELINE_POST_ID.
+    If a profiler is attached, every span is also profiled as its own stage.
+    """
+    def __init__(self, job_id=None, post_id=None, jsonl_path=METRICS_JSONL_PATH, prom_path=METRICS_PROM_PATH, profiler=None):
+        self.job_id = job_id or os.getenv('PIPELINE_JOB_ID') or uuid.uuid4().hex[:12]
+        self.post_id = post_id or os.getenv('PIPELINE_POST_ID')
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.profiler = profiler
+        self.spans = []
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """
+        Time a stage. The yielded record can be updated with 'bytes',
+        'cache_hits' and 'retries' while the stage runs, and its 'status' set
+        to 'failed' for a stage that gives up without raising.
+        """
+        record = {
+            'stage': stage,
+            'job_id': self.job_id,
+            'post_id': self.post_id,
+            'bytes': 0,
+            'cache_hits': 0,
+            'retries': 0,
+            **labels
+        }
+        record['started_at'] = datetime.now(timezone.utc).isoformat()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            with self.profiler.stage(stage) if self.profiler else nullcontext():
+                yield record
+            record.setdefault('status', 'ok')
+        except BaseException:
+            record['status'] = 'error'
+            raise
+        finally:
+            record['wall_seconds'] = time.perf_counter() - wall_start
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            self.record(record)
+
+    def record(self, record):
+        """Store a finished span and export it"""
+        self.spans.append(record)
+        try:
+            self._append_jsonl(record)
+            self._update_prometheus(record)
+        except OSError:
+            # Metrics must never break the pipeline itself
+            pass
+
+    def _append_jsonl(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        # A single O_APPEND write keeps lines intact across concurrent processes
+        fd = os.open(self.jsonl_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+    def _update_prometheus(self, record):
+        """Fold the span into the cumulative state shared by all processes and rewrite the textfile"""
+        state_path = self.prom_path + ".state.json"
+        with open(state_path, 'a+') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                state_file.seek(0)
+                raw = state_file.read()
+                state = json.loads(raw) if raw else {'stages': {}, 'last': {}}
+
+                stage = state['stages'].setdefault(record['stage'], {
+                    'count': 0, 'errors': 0, 'wall_sum': 0.0, 'cpu_sum': 0.0,
+                    'bytes_sum': 0, 'cache_hits': 0, 'retries': 0,
+                    'buckets': [0] * len(WALL_TIME_BUCKETS)
+                })
+                stage['count'] += 1
+                stage['errors'] += record['status'] != 'ok'
+                stage['wall_sum'] += record['wall_seconds']
+                stage['cpu_sum'] += record['cpu_seconds']
+                stage['bytes_sum'] += record['bytes']
+                stage['cache_hits'] += record['cache_hits']
+                stage['retries'] += record['retries']
+                for i, bound in enumerate(WALL_TIME_BUCKETS):
+                    if record['wall_seconds'] <= bound:
+                        stage['buckets'][i] += 1
+                state['last'][record['stage']] = {
+                    'job_id': record['job_id'],
+                    'post_id': record['post_id'],
+                    'wall_seconds': record['wall_seconds'],
+                    'cpu_seconds': record['cpu_seconds']
+                }
+
+                state_file.seek(0)
+                state_file.truncate()
+                json.dump(state, state_file)
+                state_file.flush()
+
+                # Write to a temp file and rename so the collector never sees a partial file
+                tmp_path = self.prom_path + ".tmp"
+                with open(tmp_path, 'w') as f:
+                    f.write(render_prometheus(state))
+                os.replace(tmp_path, self.prom_path)
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+def render_prometheus(state):
+    """Render the cumulative metrics state in the Prometheus text exposition format"""
+    lines = [
+        "# HELP reddit_tiktok_stage_wall_seconds Wall time per pipeline stage",
+        "# TYPE reddit_tiktok_stage_wall_seconds histogram"
+    ]
+    for name, stage in sorted(state['stages'].items()):
+        for bound, count in zip(WALL_TIME_BUCKETS, stage['buckets']):
+            lines.append(f'reddit_tiktok_stage_wall_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+        lines.append(f'reddit_tiktok_stage_wall_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+        lines.append(f'reddit_tiktok_stage_wall_seconds_sum{{stage="{name}"}} {stage["wall_sum"]}')
+        lines.append(f'reddit_tiktok_stage_wall_seconds_count{{stage="{name}"}} {stage["count"]}')
+
+    counters = [
+        ('cpu_seconds_total', 'cpu_sum', 'CPU time per pipeline stage'),
+        ('bytes_total', 'bytes_sum', 'Bytes produced per pipeline stage'),
+        ('cache_hits_total', 'cache_hits', 'Cache hits per pipeline stage'),
+        ('retries_total', 'retries', 'Retries per pipeline stage'),
+        ('errors_total', 'errors', 'Failed runs per pipeline stage')
+    ]
+    for metric, key, help_text in counters:
+        lines.append(f"# HELP reddit_tiktok_stage_{metric} {help_text}")
+        lines.append(f"# TYPE reddit_tiktok_stage_{metric} counter")
+        for name, stage in sorted(state['stages'].items()):
+            lines.append(f'reddit_tiktok_stage_{metric}{{stage="{name}"}} {stage[key]}')
+
+    lines.append("# HELP reddit_tiktok_stage_last_wall_seconds Wall time of the most recent run of each stage")
+    lines.append("# TYPE reddit_tiktok_stage_last_wall_seconds gauge")
+    for name, last in sorted(state['last'].items()):
+        lines.append(
+            f'reddit_tiktok_stage_last_wall_seconds{{stage="{name}",job_id="{last["job_id"]}",'
+            f'post_id="{last["post_id"]}"}} {last["wall_seconds"]}'
+        )
+    return "\n".join(lines) + "\n"
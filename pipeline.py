@@ -1,11 +1,26 @@
 import praw
+import prawcore
 import os
 import json
 import time
 import logging
 from datetime import datetime, timezone
-import subprocess
 import sys
+import uuid
+import argparse
+import queue
+import threading
+from metrics import Metrics
+from profiling import create_profiler, PROFILE_ENV_VAR
+from worker import submit_job, worker_available, RESPONSE_GRACE_SECONDS
+from spool import JobSpool, run_spool_worker, SPOOL_PATH
+from dedupe import DedupeIndex, DEDUPE_PATH
+from ratelimit import get_rate_limiter
+from childproc import run_child
+from main import composition_manifest
+import render_cache
+from uploader import DEFAULT_DESCRIPTION
+from series import load_manifest, mark_uploaded, series_caption, output_paths, remove_outputs, MAX_PART_SECONDS
 
 # Set up logging
 logging.basicConfig(
@@ -18,8 +33,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+VIDEOS_DIR = "videos"
+# Child scripts still running after this many seconds are treated as hung and killed
+RENDER_TIMEOUT = 3600
+UPLOAD_TIMEOUT = 1200
+
+class PipelineJob:
+    """One post moving through the render and upload stages"""
+    def __init__(self, post_id, title, text="", author="[deleted]", permalink="", job_id=None, videos_dir=VIDEOS_DIR):
+        self.post_id = post_id
+        self.title = title
+        self.text = text
+        self.author = author
+        self.permalink = permalink
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.output_path = os.path.join(videos_dir, f"{post_id}.mp4")
+        self.description = DEFAULT_DESCRIPTION
+        self.metrics = Metrics(job_id=self.job_id, post_id=post_id)
+    
+    @classmethod
+    def from_spool(cls, spool_job):
+        payload = spool_job['payload']
+        job = cls(spool_job['post_id'], payload['title'], payload.get('text', ""),
+                  payload.get('author', "[deleted]"), payload.get('permalink', ""), job_id=spool_job['id'])
+        job.output_path = spool_job['result'].get('output_path', spool_job['payload']['output_path'])
+        job.description = spool_job['payload']['description']
+        return job
+    
+    @classmethod
+    def from_post(cls, post, videos_dir=VIDEOS_DIR):
+        author = post.author.name if post.author else "[deleted]"
+        return cls(post.id, post.title, post.selftext, author, post.permalink, videos_dir=videos_dir)
+    
+    def snapshot(self):
+        """Same shape as main.post_snapshot, for hashing the composition before rendering"""
+        return {
+            'id': self.post_id,
+            'title': self.title,
+            'selftext': self.text,
+            'author': self.author,
+            'permalink': self.permalink
+        }
+
 class RedditTikTokPipeline:
-    def __init__(self):
+    def __init__(self, profile=False, profile_sample=False, dedupe_mode="reject", dedupe_threshold=None,
+                 series=False, max_part_seconds=MAX_PART_SECONDS, render_timeout=RENDER_TIMEOUT,
+                 upload_timeout=UPLOAD_TIMEOUT, upload_backend="selenium"):
         # Reddit API credentials
         self.reddit = praw.Reddit(
             client_id="4VdpyQlsHzbdIwOfEov8XQ",
@@ -31,46 +90,133 @@ class RedditTikTokPipeline:
         self.last_post_file = "last_processed_post.json"
         
         # Initialize last processed post data
+        self.state_lock = threading.Lock()
         self.last_processed = self.load_last_processed()
+        
+        # Timing spans for the current cycle, shared with child processes via the environment
+        self.metrics = Metrics()
+        
+        # Near-duplicate detection against every story already rendered
+        self.dedupe = DedupeIndex(DEDUPE_PATH) if dedupe_mode != "off" else None
+        if self.dedupe and dedupe_threshold is not None:
+            self.dedupe.threshold = dedupe_threshold
+        self.dedupe_mode = dedupe_mode
+        
+        # Long stories become several part videos instead of one
+        self.series = series
+        self.max_part_seconds = max_part_seconds
+        
+        self.render_timeout = render_timeout
+        self.upload_timeout = upload_timeout
+        self.upload_backend = upload_backend
+        
+        # Opt-in per-stage profiling for this process and its child scripts
+        self.profile = profile or profile_sample
+        self.profile_sample = profile_sample
     
     def load_last_processed(self):
         """Load information about the last processed post"""
         try:
             if os.path.exists(self.last_post_file):
                 with open(self.last_post_file, 'r') as f:
-                    return json.load(f)
+                    data = json.load(f)
+                # Older files only tracked the single last post
+                data.setdefault('processed_ids', [data['post_id']] if data.get('post_id') else [])
+                return data
             return {
                 'post_id': None,
-                'timestamp': None
+                'timestamp': None,
+                'processed_ids': []
             }
         except Exception as e:
             logger.error(f"Error loading last processed post: {e}")
-            return {'post_id': None, 'timestamp': None}
+            return {'post_id': None, 'timestamp': None, 'processed_ids': []}
     
     def save_last_processed(self, post_id):
         """Save information about the last processed post"""
         try:
-            data = {
-                'post_id': post_id,
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            }
-            with open(self.last_post_file, 'w') as f:
-                json.dump(data, f)
+            with self.state_lock:
+                processed_ids = self.last_processed.get('processed_ids', [])
+                if post_id not in processed_ids:
+                    processed_ids.append(post_id)
+                data = {
+                    'post_id': post_id,
+                    'timestamp': datetime.now(timezone.utc).isoformat(),
+                    # Keep a bounded history so the file does not grow forever
+                    'processed_ids': processed_ids[-1000:]
+                }
+                with open(self.last_post_file, 'w') as f:
+                    json.dump(data, f)
+                self.last_processed = data
         except Exception as e:
             logger.error(f"Error saving last processed post: {e}")
     
     def get_top_post(self):
         """Get the current top post from r/nosleep"""
         try:
+            get_rate_limiter().acquire('reddit')
             subreddit = self.reddit.subreddit("nosleep")
             for post in subreddit.hot(limit=10):  # Check top 10 to skip pinned posts
                 if not post.stickied:
                     return post
             return None
+        except prawcore.exceptions.TooManyRequests:
+            get_rate_limiter().throttled('reddit')
+            logger.error("Reddit rate limit hit while getting top post")
+            return None
         except Exception as e:
             logger.error(f"Error getting top post: {e}")
             return None
     
+    def get_hot_posts(self, limit):
+        """Get up to limit non-stickied hot posts from r/nosleep, best first"""
+        try:
+            get_rate_limiter().acquire('reddit')
+            subreddit = self.reddit.subreddit("nosleep")
+            posts = [post for post in subreddit.hot(limit=limit + 5) if not post.stickied]
+            return posts[:limit]
+        except prawcore.exceptions.TooManyRequests:
+            get_rate_limiter().throttled('reddit')
+            logger.error("Reddit rate limit hit while getting hot posts")
+            return []
+        except Exception as e:
+            logger.error(f"Error getting hot posts: {e}")
+            return []
+    
+    def is_processed(self, post):
+        """Check whether this post was already uploaded"""
+        with self.state_lock:
+            return post.id in self.last_processed.get('processed_ids', [])
+    
+    def is_duplicate(self, post):
+        """
+        Check the post against the index of rendered stories. In reject mode a
+        near-duplicate is marked processed so it is never rendered; in flag
+        mode it is only logged.
+        """
+        if not self.dedupe:
+            return False
+        try:
+            duplicate, match_id, similarity = self.dedupe.is_duplicate(post.title + "\n" + post.selftext, post.id)
+        except Exception as e:
+            logger.error(f"Error checking for duplicates: {e}")
+            return False
+        if not duplicate:
+            return False
+        logger.warning(f"Post {post.id} is {similarity:.0%} similar to already rendered post {match_id}")
+        if self.dedupe_mode == "flag":
+            return False
+        self.save_last_processed(post.id)
+        return True
+    
+    def record_story(self, job):
+        """Add a story that has been (or, on a spool, is about to be) rendered to the dedupe index"""
+        if self.dedupe and job.text:
+            try:
+                self.dedupe.add(job.post_id, job.title + "\n" + job.text, job.title)
+            except Exception as e:
+                logger.error(f"Error indexing rendered post: {e}")
+    
     def is_new_post(self, post):
         """Check if this is a new top post we haven't processed yet"""
         if not post:
@@ -82,46 +228,135 @@ class RedditTikTokPipeline:
             
         return post.id != last_id
     
-    def run_video_generator(self):
-        """Run the video generation script"""
+    def child_env(self, metrics=None):
+        """Environment for child scripts so their metrics share this job's job and post ids"""
+        metrics = metrics or self.metrics
+        env = os.environ.copy()
+        env['PIPELINE_JOB_ID'] = metrics.job_id
+        if metrics.post_id:
+            env['PIPELINE_POST_ID'] = metrics.post_id
+        if self.profile:
+            env[PROFILE_ENV_VAR] = "sample" if self.profile_sample else "1"
+        return env
+    
+    def restore_cached_render(self, job):
+        """Reuse an earlier render of the same composition, skipping the generator entirely"""
+        with job.metrics.span("render_cache") as span:
+            try:
+                composition = composition_manifest(
+                    job.snapshot(), series=self.series, max_part_seconds=self.max_part_seconds
+                )
+                span['cache_hits'] = int(render_cache.restore(render_cache.manifest_hash(composition), job.output_path))
+            except OSError as e:
+                logger.warning(f"Render cache lookup failed: {e}")
+        return span['cache_hits'] > 0
+    
+    def run_video_generator(self, job=None):
+        """Run the video generation on a warm worker if one is running, otherwise as a script"""
+        metrics = job.metrics if job else self.metrics
+        if job and self.restore_cached_render(job):
+            logger.info(f"Reusing cached render for {job.post_id}")
+            return True
+        command = ["python", "main.py"]
+        if job:
+            command += ["--post-id", job.post_id, "--output", job.output_path]
+        if self.series:
+            command += ["--series", "--max-part-seconds", str(self.max_part_seconds)]
         try:
+            if worker_available():
+                logger.info("Starting video generation on warm worker...")
+                response = submit_job({
+                    'command': 'create_video',
+                    'job_id': metrics.job_id,
+                    'post_id': job.post_id if job else None,
+                    'output_path': job.output_path if job else None,
+                    'profile': self.profile,
+                    'profile_sample': self.profile_sample,
+                    'series': self.series,
+                    'max_part_seconds': self.max_part_seconds,
+                    # The worker enforces this itself and restarts after killing a hung render
+                    'timeout': self.render_timeout
+                }, timeout=self.render_timeout + RESPONSE_GRACE_SECONDS)
+                if response.get('ok'):
+                    logger.info(f"Video generation completed successfully in {response['seconds']:.1f} seconds")
+                    return True
+                if response.get('timed_out'):
+                    logger.error(f"Video generation hung on the worker and was killed after {self.render_timeout} seconds")
+                    return False
+                logger.error(f"Video generation failed: {response.get('error')}")
+                return False
+            
             logger.info("Starting video generation...")
-            result = subprocess.run(["python", "main.py"], capture_output=True, text=True)
+            child = run_child(command, f"render {job.post_id}" if job else "render",
+                              timeout=self.render_timeout, env=self.child_env(metrics))
             
-            if result.returncode == 0:
-                logger.info("Video generation completed successfully")
+            if child.returncode == 0:
+                logger.info(f"Video generation completed successfully in {child.duration:.1f} seconds")
                 return True
+            elif child.timed_out:
+                logger.error(f"Video generation hung and was killed after {self.render_timeout} seconds")
+                return False
             else:
-                logger.error(f"Video generation failed: {result.stderr}")
+                logger.error(f"Video generation failed, last output:\n{child.tail_text()}")
                 return False
         except Exception as e:
             logger.error(f"Error running video generator: {e}")
             return False
     
-    def run_uploader(self):
-        """Run the TikTok uploader script"""
+    def run_uploader(self, job=None):
+        """Upload a rendered video, or each part of a series in order with a series caption"""
+        output_path = job.output_path if job else "output_video.mp4"
+        description = job.description if job else DEFAULT_DESCRIPTION
+        manifest = load_manifest(output_path)
+        if manifest is None:
+            return self.upload_video(output_path, description, job)
+        
+        total = len(manifest['parts'])
+        for part in manifest['parts']:
+            # Parts uploaded by an earlier attempt of this job are not posted twice
+            if part['uploaded']:
+                continue
+            logger.info(f"Uploading part {part['part']}/{total}...")
+            if not self.upload_video(part['path'], series_caption(manifest, part['part'], description), job):
+                return False
+            mark_uploaded(output_path, part['part'])
+        return True
+    
+    def upload_video(self, video_path, description, job=None):
+        """Run the TikTok uploader script for one video"""
+        metrics = job.metrics if job else self.metrics
+        command = ["python", "uploader.py", "--video", video_path, "--description", description,
+                   "--backend", self.upload_backend]
         try:
             logger.info("Starting TikTok upload...")
-            result = subprocess.run(["python", "uploader.py"], capture_output=True, text=True)
+            child = run_child(command, f"upload {job.post_id}" if job else "upload",
+                              timeout=self.upload_timeout, env=self.child_env(metrics))
             
-            if result.returncode == 0:
+            if child.returncode == 0:
                 logger.info("Upload completed successfully")
                 return True
+            elif child.timed_out:
+                logger.error(f"Upload hung and was killed after {self.upload_timeout} seconds")
+                return False
             else:
-                logger.error(f"Upload failed: {result.stderr}")
+                logger.error(f"Upload failed, last output:\n{child.tail_text()}")
                 return False
         except Exception as e:
             logger.error(f"Error running uploader: {e}")
             return False
     
-    def check_video_exists(self):
+    def check_outputs(self, output_path="output_video.mp4"):
+        """Check that a render wrote its video, or every part of its series"""
+        return all(self.check_video_exists(path) for path in output_paths(output_path))
+    
+    def check_video_exists(self, video_path="output_video.mp4"):
         """Check if output video exists and is recent"""
         try:
-            if not os.path.exists("output_video.mp4"):
+            if not os.path.exists(video_path):
                 return False
                 
             # Check if video is less than 10 minutes old
-            video_time = os.path.getmtime("output_video.mp4")
+            video_time = os.path.getmtime(video_path)
             current_time = time.time()
             return (current_time - video_time) < 600  # 10 minutes in seconds
             
@@ -133,12 +368,19 @@ class RedditTikTokPipeline:
         """Run the complete pipeline"""
         try:
             logger.info("Starting pipeline check...")
+            job_id = uuid.uuid4().hex[:12]
+            self.metrics = Metrics(
+                job_id=job_id,
+                profiler=create_profiler(job_id, enabled=self.profile, sample=self.profile_sample)
+            )
             
             # Get current top post
-            top_post = self.get_top_post()
+            with self.metrics.span("pipeline_fetch"):
+                top_post = self.get_top_post()
             if not top_post:
                 logger.error("Could not get top post")
                 return False
+            self.metrics.post_id = top_post.id
             
             # Check if it's a new post
             if not self.is_new_post(top_post):
@@ -147,18 +389,27 @@ class RedditTikTokPipeline:
                 
             logger.info(f"New top post found: {top_post.title[:50]}...")
             
+            if self.is_duplicate(top_post):
+                logger.info("Skipping near-duplicate of an already rendered story")
+                return True
+            
             # Run video generator
-            if not self.run_video_generator():
+            with self.metrics.span("pipeline_generate"):
+                generated = self.run_video_generator()
+            if not generated:
                 logger.error("Video generation failed")
                 return False
             
             # Verify video was created
-            if not self.check_video_exists():
+            if not self.check_outputs():
                 logger.error("Video file not found or is too old")
                 return False
+            self.record_story(PipelineJob.from_post(top_post))
             
             # Run uploader
-            if not self.run_uploader():
+            with self.metrics.span("pipeline_upload"):
+                uploaded = self.run_uploader()
+            if not uploaded:
                 logger.error("Upload failed")
                 return False
             
@@ -170,9 +421,295 @@ class RedditTikTokPipeline:
         except Exception as e:
             logger.error(f"Pipeline error: {e}")
             return False
+        finally:
+            profile_summary = self.metrics.profiler.finish() if self.metrics.profiler else ""
+            if profile_summary:
+                logger.info(f"Pipeline profiles written to {self.metrics.profiler.output_dir}{profile_summary}")
+
+class ConcurrentPipeline:
+    """
+    Runs fetch, render and upload as overlapping stages connected by bounded
+    queues, each with its own pool of worker threads. While post N uploads,
+    post N+1 renders and the next fetch runs. A full render queue blocks the
+    fetcher, which is how backpressure reaches Reddit.
+    """
+    def __init__(self, pipeline, render_workers=1, upload_workers=1, queue_size=2,
+                 posts_per_fetch=3, fetch_interval=1800):
+        self.pipeline = pipeline
+        self.render_workers = render_workers
+        self.upload_workers = upload_workers
+        self.posts_per_fetch = posts_per_fetch
+        self.fetch_interval = fetch_interval
+        self.render_queue = queue.Queue(maxsize=queue_size)
+        self.upload_queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        
+        # Posts currently somewhere in the pipeline, so a fetch does not enqueue them twice
+        self.in_flight = set()
+        self.in_flight_lock = threading.Lock()
+        
+        self.started_at = None
+        self.completed = 0
+    
+    def make_profiler(self, job_id):
+        # Render and upload threads overlap and only one cProfile profiler can run per process,
+        # so here only the child scripts (told through PIPELINE_PROFILE) profile themselves
+        return create_profiler(job_id, enabled=False)
+    
+    def put(self, q, job):
+        """Blocking put that still notices shutdown"""
+        while not self.stop_event.is_set():
+            try:
+                q.put(job, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def get(self, q):
+        """Blocking get that still notices shutdown"""
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=1)
+            except queue.Empty:
+                continue
+        return None
+    
+    def finish_job(self, job):
+        with self.in_flight_lock:
+            self.in_flight.discard(job.post_id)
+    
+    def fetch_loop(self):
+        while not self.stop_event.is_set():
+            metrics = Metrics()
+            with metrics.span("pipeline_fetch"):
+                posts = self.pipeline.get_hot_posts(self.posts_per_fetch)
+            
+            for post in posts:
+                with self.in_flight_lock:
+                    if post.id in self.in_flight:
+                        continue
+                if self.pipeline.is_processed(post) or self.pipeline.is_duplicate(post):
+                    continue
+                
+                job = PipelineJob.from_post(post)
+                job.metrics.profiler = self.make_profiler(job.job_id)
+                with self.in_flight_lock:
+                    self.in_flight.add(post.id)
+                logger.info(f"Queueing post for render: {post.title[:50]}...")
+                # Blocks while the render queue is full
+                if not self.put(self.render_queue, job):
+                    return
+            
+            logger.info(f"Next fetch in {self.fetch_interval // 60} minutes...")
+            self.stop_event.wait(self.fetch_interval)
+    
+    def render_loop(self):
+        os.makedirs(VIDEOS_DIR, exist_ok=True)
+        while True:
+            job = self.get(self.render_queue)
+            if job is None:
+                return
+            try:
+                logger.info(f"Rendering {job.post_id}: {job.title[:50]}...")
+                with job.metrics.span("pipeline_generate"):
+                    generated = self.pipeline.run_video_generator(job)
+                if not generated or not self.pipeline.check_outputs(job.output_path):
+                    logger.error(f"Video generation failed for {job.post_id}")
+                    self.finish_job(job)
+                    continue
+                self.pipeline.record_story(job)
+                # Blocks while the upload queue is full
+                if not self.put(self.upload_queue, job):
+                    return
+            except Exception as e:
+                logger.error(f"Render worker error for {job.post_id}: {e}")
+                self.finish_job(job)
+            finally:
+                self.render_queue.task_done()
+    
+    def upload_loop(self):
+        while True:
+            job = self.get(self.upload_queue)
+            if job is None:
+                return
+            try:
+                logger.info(f"Uploading {job.post_id}...")
+                with job.metrics.span("pipeline_upload"):
+                    uploaded = self.pipeline.run_uploader(job)
+                if uploaded:
+                    self.pipeline.save_last_processed(job.post_id)
+                    remove_outputs(job.output_path)
+                    with self.in_flight_lock:
+                        self.completed += 1
+                        completed = self.completed
+                    hours = (time.time() - self.started_at) / 3600
+                    logger.info(f"Uploaded {job.post_id} ({completed / hours:.2f} stories/hour so far)")
+                else:
+                    logger.error(f"Upload failed for {job.post_id}")
+            except Exception as e:
+                logger.error(f"Upload worker error for {job.post_id}: {e}")
+            finally:
+                profile_summary = job.metrics.profiler.finish() if job.metrics.profiler else ""
+                if profile_summary:
+                    logger.info(f"Pipeline profiles written to {job.metrics.profiler.output_dir}{profile_summary}")
+                self.finish_job(job)
+                self.upload_queue.task_done()
+    
+    def run(self):
+        """Start every stage and block until interrupted"""
+        self.started_at = time.time()
+        threads = [threading.Thread(target=self.fetch_loop, name="fetch", daemon=True)]
+        threads += [threading.Thread(target=self.render_loop, name=f"render-{i}", daemon=True)
+                    for i in range(self.render_workers)]
+        threads += [threading.Thread(target=self.upload_loop, name=f"upload-{i}", daemon=True)
+                    for i in range(self.upload_workers)]
+        for thread in threads:
+            thread.start()
+        
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("Pipeline stopped by user")
+        finally:
+            self.stop_event.set()
+
+class SpoolPipeline:
+    """
+    Distributed variant of the pipeline around a shared SQLite job spool.
+    The fetch node only enqueues new posts; any number of render nodes drain
+    the queue and publish their output path, and upload nodes pick up the
+    rendered jobs. Videos must live in a directory all nodes can reach.
+    """
+    def __init__(self, pipeline, spool_path=SPOOL_PATH, videos_dir=VIDEOS_DIR,
+                 posts_per_fetch=3, fetch_interval=1800):
+        self.pipeline = pipeline
+        self.spool = JobSpool(spool_path)
+        self.videos_dir = videos_dir
+        self.posts_per_fetch = posts_per_fetch
+        self.fetch_interval = fetch_interval
+    
+    def fetch_once(self):
+        """Enqueue every new hot post; returns how many were added"""
+        metrics = Metrics()
+        with metrics.span("pipeline_fetch"):
+            posts = self.pipeline.get_hot_posts(self.posts_per_fetch)
+        added = 0
+        for post in posts:
+            # The spool, not this node's last_processed_post.json, records what any node has taken on
+            if self.spool.has_post(post.id):
+                continue
+            if self.pipeline.is_duplicate(post):
+                continue
+            job = PipelineJob.from_post(post, videos_dir=self.videos_dir)
+            if self.spool.enqueue(post.id, {
+                'title': post.title,
+                'text': post.selftext,
+                'author': job.author,
+                'permalink': job.permalink,
+                'output_path': job.output_path,
+                'description': job.description
+            }, job_id=job.job_id):
+                # Indexed here rather than on the render nodes, so the one index the fetcher checks sees every story
+                self.pipeline.record_story(job)
+                logger.info(f"Spooled post for render: {post.title[:50]}...")
+                added += 1
+        logger.info(f"Spool status: {self.spool.counts()}")
+        return added
+    
+    def run_fetcher(self):
+        while True:
+            self.fetch_once()
+            logger.info(f"Next fetch in {self.fetch_interval // 60} minutes...")
+            time.sleep(self.fetch_interval)
+    
+    def render_job(self, spool_job):
+        job = PipelineJob.from_spool(spool_job)
+        os.makedirs(os.path.dirname(job.output_path) or ".", exist_ok=True)
+        with job.metrics.span("pipeline_generate"):
+            generated = self.pipeline.run_video_generator(job)
+        if not generated or not self.pipeline.check_outputs(job.output_path):
+            return None
+        return {'output_path': job.output_path}
+    
+    def upload_job(self, spool_job):
+        job = PipelineJob.from_spool(spool_job)
+        with job.metrics.span("pipeline_upload"):
+            uploaded = self.pipeline.run_uploader(job)
+        if not uploaded:
+            return None
+        # The job's 'done' state in the spool is what marks the post processed for every node
+        remove_outputs(job.output_path)
+        return {'uploaded_at': datetime.now(timezone.utc).isoformat()}
+    
+    def run_worker(self, role):
+        """Drain the spool as a render or upload node until interrupted"""
+        handler = self.render_job if role == 'render' else self.upload_job
+        run_spool_worker(self.spool, role, handler)
 
 def main():
-    pipeline = RedditTikTokPipeline()
+    parser = argparse.ArgumentParser(description="Turn new top r/nosleep posts into TikTok uploads")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile every stage of the pipeline and its child scripts into profiles/<job_id>")
+    parser.add_argument("--profile-sample", action="store_true",
+                        help="Also sample call stacks from a background thread (implies --profile)")
+    parser.add_argument("--serial", action="store_true",
+                        help="Run fetch, render and upload one after another instead of overlapping them")
+    parser.add_argument("--render-workers", type=int, default=1)
+    parser.add_argument("--upload-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=2, help="Capacity of each queue between stages")
+    parser.add_argument("--posts-per-fetch", type=int, default=3, help="How many top hot posts to consider per fetch")
+    parser.add_argument("--dedupe", choices=["reject", "flag", "off"], default="reject",
+                        help="What to do with near-duplicates of already rendered stories")
+    parser.add_argument("--dedupe-threshold", type=float, help="Similarity above which a story is a duplicate")
+    parser.add_argument("--series", action="store_true", help="Split long stories into parts uploaded as a series")
+    parser.add_argument("--max-part-seconds", type=float, default=MAX_PART_SECONDS,
+                        help=f"Longest a part may run in series mode (default: {MAX_PART_SECONDS})")
+    parser.add_argument("--render-timeout", type=int, default=RENDER_TIMEOUT,
+                        help="Kill a video generation still running after this many seconds")
+    parser.add_argument("--upload-timeout", type=int, default=UPLOAD_TIMEOUT,
+                        help="Kill an upload still running after this many seconds")
+    parser.add_argument("--upload-backend", choices=["selenium", "http"], default="selenium",
+                        help="How uploader.py sends videos to TikTok")
+    parser.add_argument("--spool", help="Use this shared SQLite job spool instead of in-process queues")
+    parser.add_argument("--role", choices=["fetch", "render", "upload"], default="fetch",
+                        help="What this node does with the spool")
+    parser.add_argument("--videos-dir", default=VIDEOS_DIR, help="Directory for rendered videos, shared between nodes")
+    args = parser.parse_args()
+    
+    pipeline = RedditTikTokPipeline(
+        profile=args.profile,
+        profile_sample=args.profile_sample,
+        dedupe_mode=args.dedupe,
+        dedupe_threshold=args.dedupe_threshold,
+        series=args.series,
+        max_part_seconds=args.max_part_seconds,
+        render_timeout=args.render_timeout,
+        upload_timeout=args.upload_timeout,
+        upload_backend=args.upload_backend
+    )
+    
+    if args.spool:
+        spool_pipeline = SpoolPipeline(pipeline, args.spool, args.videos_dir, posts_per_fetch=args.posts_per_fetch)
+        try:
+            if args.role == "fetch":
+                spool_pipeline.run_fetcher()
+            else:
+                spool_pipeline.run_worker(args.role)
+        except KeyboardInterrupt:
+            logger.info("Pipeline stopped by user")
+        return
+    
+    if not args.serial:
+        ConcurrentPipeline(
+            pipeline,
+            render_workers=args.render_workers,
+            upload_workers=args.upload_workers,
+            queue_size=args.queue_size,
+            posts_per_fetch=args.posts_per_fetch
+        ).run()
+        return
     
     while True:
         try:
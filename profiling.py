@@ -0,0 +1,134 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+PROFILES_DIR = "profiles"
+# Set by the pipeline so child scripts profile themselves too ("1", or "sample" to add stack sampling)
+PROFILE_ENV_VAR = "PIPELINE_PROFILE"
+
+def profiling_requested():
+    """Whether profiling was switched on for this process through the environment"""
+    return os.getenv(PROFILE_ENV_VAR) in ("1", "sample")
+
+def sampling_requested():
+    """Whether the sampling profiler thread was switched on through the environment"""
+    return os.getenv(PROFILE_ENV_VAR) == "sample"
+
+def format_frame(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+def format_func(func):
+    filename, line, name = func
+    return f"{os.path.basename(filename)}:{name}:{line}"
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread at a fixed interval into collapsed-stack counts"""
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(format_frame(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+class Profiler:
+    """
+    Opt-in per-stage CPU profiler. Each stage gets its own cProfile profile,
+    accumulated across repeated runs of the stage (e.g. every card render),
+    and optionally a sampling thread that records real call stacks for the
+    frame loop. When disabled, stage() is a no-op nullcontext.
+    """
+    def __init__(self, output_dir, enabled=True, sample=False, sample_interval=0.005, top_n=15):
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.sample = sample
+        self.sample_interval = sample_interval
+        self.top_n = top_n
+        self._profiles = {}
+        self._samples = {}
+        self._active = None
+
+    def stage(self, name):
+        """Profile the enclosed block under the given stage name"""
+        # Nested stages are folded into the outer one, since only one profiler can run at a time
+        if not self.enabled or self._active is not None:
+            return nullcontext()
+        return self._profile_stage(name)
+
+    @contextmanager
+    def _profile_stage(self, name):
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        sampler = None
+        if self.sample:
+            sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+        self._active = name
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._active = None
+            if sampler:
+                sampler.stop()
+                self._samples.setdefault(name, Counter()).update(sampler.stacks)
+
+    def collapsed_stacks(self, name):
+        """
+        Collapsed stacks for a stage: real sampled stacks when sampling is on,
+        otherwise caller;callee pairs weighted by own time from cProfile
+        """
+        if name in self._samples:
+            interval_us = int(self.sample_interval * 1e6)
+            return {stack: count * interval_us for stack, count in self._samples[name].items()}
+
+        stats = pstats.Stats(self._profiles[name])
+        stacks = Counter()
+        for func, (_, _, own_time, _, callers) in stats.stats.items():
+            callee = format_func(func)
+            if not callers:
+                stacks[callee] += int(own_time * 1e6)
+                continue
+            for caller, caller_stats in callers.items():
+                stacks[f"{format_func(caller)};{callee}"] += int(caller_stats[2] * 1e6)
+        return stacks
+
+    def finish(self):
+        """Write .pstats and .collapsed files per stage and return a top-N summary"""
+        if not self.enabled or not self._profiles:
+            return ""
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary = io.StringIO()
+        for name, profile in self._profiles.items():
+            profile.dump_stats(os.path.join(self.output_dir, f"{name}.pstats"))
+            with open(os.path.join(self.output_dir, f"{name}.collapsed"), 'w') as f:
+                for stack, weight in sorted(self.collapsed_stacks(name).items()):
+                    if weight > 0:
+                        f.write(f"{stack} {weight}\n")
+
+            summary.write(f"\n=== {name}: top {self.top_n} by cumulative time ===\n")
+            stats = pstats.Stats(profile, stream=summary)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+        return summary.getvalue()
+
+def create_profiler(job_id, enabled, sample=False, top_n=15):
+    """Build a profiler that writes into profiles/<job_id>, or a disabled one"""
+    return Profiler(os.path.join(PROFILES_DIR, job_id), enabled=enabled, sample=sample, top_n=top_n)
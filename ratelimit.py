@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RATELIMIT_PATH = "ratelimit.db"
+
+# name -> (requests per second, burst size). gTTS and TikTok publish no
+# limits, so these stay close to the pacing the scripts used before; Reddit
+# allows 100 requests a minute per OAuth client.
+DEFAULT_BUCKETS = {
+    'gtts': (0.5, 2),
+    'reddit': (1.5, 10),
+    'uploader': (1 / 120, 2)
+}
+# A 429 multiplies the shared refill rate by this, down to MIN_RATE_FRACTION of the configured rate
+BACKOFF_FACTOR = 0.5
+MIN_RATE_FRACTION = 0.05
+# 429s arriving within this many seconds of a cut count as the same overload
+DECREASE_COOLDOWN = 1.0
+# Without further 429s the rate climbs back to the configured rate over this many seconds
+RECOVERY_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    rate REAL NOT NULL,
+    base_rate REAL NOT NULL,
+    capacity REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    throttled_count INTEGER NOT NULL DEFAULT 0,
+    throttled_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+class RateLimiter:
+    """
+    Token buckets in a SQLite file shared by every process on the host. Each
+    acquire reserves its tokens in one BEGIN IMMEDIATE transaction and then
+    sleeps off any debt, so callers queue up behind each other instead of
+    polling. A 429 reported by any process cuts the shared refill rate
+    (multiplicative decrease), which then recovers linearly.
+    """
+    def __init__(self, path=RATELIMIT_PATH, buckets=None, recovery_seconds=RECOVERY_SECONDS):
+        self.path = path
+        self.buckets = buckets or DEFAULT_BUCKETS
+        self.recovery_seconds = recovery_seconds
+        self._local = threading.local()
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+        now = time.time()
+        for name, (rate, capacity) in self.buckets.items():
+            conn.execute(
+                "INSERT OR IGNORE INTO buckets (name, tokens, rate, base_rate, capacity, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (name, capacity, rate, rate, capacity, now)
+            )
+            # Configuration changes apply to an existing file, without undoing a current slowdown
+            conn.execute(
+                "UPDATE buckets SET base_rate = ?, capacity = ?, rate = MIN(rate, ?) WHERE name = ?",
+                (rate, capacity, rate, name)
+            )
+
+    def connect(self):
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _refill(self, row, now):
+        """Tokens and rate for a bucket row brought forward to now"""
+        elapsed = max(0.0, now - row['updated_at'])
+        rate = min(row['base_rate'], row['rate'] + row['base_rate'] * elapsed / self.recovery_seconds)
+        tokens = min(row['capacity'], row['tokens'] + elapsed * rate)
+        return tokens, rate
+
+    def _update(self, name, change):
+        """Run change(tokens, rate) -> (tokens, rate, result) on a bucket under the write lock"""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT * FROM buckets WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown rate limit bucket: {name}")
+            now = time.time()
+            tokens, rate = self._refill(row, now)
+            tokens, rate, result = change(tokens, rate, row)
+            conn.execute(
+                "UPDATE buckets SET tokens = ?, rate = ?, updated_at = ? WHERE name = ?",
+                (tokens, rate, now, name)
+            )
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _reserve(self, name, tokens):
+        """Take tokens from a bucket and return how long the caller must wait for them"""
+        def reserve(available, rate, row):
+            # The balance may go negative: that debt is this caller's place in the queue
+            remaining = available - tokens
+            return remaining, rate, max(0.0, -remaining / rate)
+        return self._update(name, reserve)
+
+    def acquire(self, name, tokens=1):
+        """Block until the bucket grants tokens; returns the seconds spent waiting"""
+        wait = self._reserve(name, tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, name, tokens=1):
+        """acquire() for coroutines: waits with asyncio.sleep so the event loop keeps running"""
+        wait = self._reserve(name, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def throttled(self, name, retry_after=None):
+        """
+        Report a 429 from the service behind a bucket. Halves the shared rate
+        (once per overload, however many callers saw it) and empties the bucket
+        so no process bursts straight into the limit, pushing everyone back by
+        retry_after seconds if the server sent one.
+        """
+        def back_off(available, rate, row):
+            now = time.time()
+            if now - row['throttled_at'] > DECREASE_COOLDOWN:
+                rate = max(row['base_rate'] * MIN_RATE_FRACTION, rate * BACKOFF_FACTOR)
+                self.connect().execute("UPDATE buckets SET throttled_at = ? WHERE name = ?", (now, name))
+            new_tokens = min(available, 0.0) - (retry_after or 0) * rate
+            return new_tokens, rate, rate
+        new_rate = self._update(name, back_off)
+        self.connect().execute(
+            "UPDATE buckets SET throttled_count = throttled_count + 1 WHERE name = ?", (name,)
+        )
+        logger.warning(f"{name} rate limited, shared rate is now {new_rate:.3f} requests/second")
+        return new_rate
+
+    def state(self, name):
+        """Current tokens, rate and 429 count of a bucket"""
+        row = self.connect().execute("SELECT * FROM buckets WHERE name = ?", (name,)).fetchone()
+        tokens, rate = self._refill(row, time.time())
+        return {'tokens': tokens, 'rate': rate, 'base_rate': row['base_rate'], 'throttled': row['throttled_count']}
+
+_rate_limiter = None
+
+def get_rate_limiter():
+    """Create the host-wide rate limiter once per process"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
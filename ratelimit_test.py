@@ -0,0 +1,136 @@
+import asyncio
+import collections
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ratelimit import RateLimiter
+
+class FakeEndpoint(ThreadingHTTPServer):
+    """Local stand-in for gTTS or Reddit: answers 429 once requests exceed qps over the last second"""
+    def __init__(self, qps):
+        self.qps = qps
+        self.recent = collections.deque()
+        self.lock = threading.Lock()
+        self.served = 0
+        self.throttled = 0
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+class FakeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        now = time.monotonic()
+        with server.lock:
+            while server.recent and now - server.recent[0] > 1.0:
+                server.recent.popleft()
+            server.recent.append(now)
+            limited = len(server.recent) > server.qps
+            if limited:
+                server.throttled += 1
+            else:
+                server.served += 1
+        self.send_response(429 if limited else 200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_endpoint(qps):
+    server = FakeEndpoint(qps)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def call(limiter, url):
+    """One paced request; returns the status and reports 429s to the shared bucket"""
+    limiter.acquire('fake')
+    try:
+        urllib.request.urlopen(url, timeout=5).close()
+        return 200
+    except urllib.error.HTTPError as e:
+        if e.code == 429:
+            limiter.throttled('fake')
+        return e.code
+
+def client_process(db_path, url, requests, buckets, results):
+    limiter = RateLimiter(db_path, buckets=buckets)
+    results.put([call(limiter, url) for _ in range(requests)])
+
+def test_processes_share_one_bucket():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "ratelimit.db")
+        server = start_endpoint(qps=20)
+        # Each process alone would stay under the endpoint's limit only by sharing the bucket
+        buckets = {'fake': (15, 1)}
+        RateLimiter(db_path, buckets=buckets)
+        results = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(target=client_process, args=(db_path, server.url, 10, buckets, results))
+            for _ in range(3)
+        ]
+        start = time.monotonic()
+        for client in clients:
+            client.start()
+        statuses = [status for _ in clients for status in results.get(timeout=30)]
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - start
+        server.shutdown()
+
+        assert statuses == [200] * 30
+        assert server.throttled == 0
+        # 30 requests at 15 per second, no matter how many processes sent them
+        assert elapsed >= 29 / 15 * 0.9
+
+def test_429s_shrink_the_shared_rate():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "ratelimit.db")
+        server = start_endpoint(qps=8)
+        # Configured well above what the endpoint allows
+        limiter = RateLimiter(db_path, buckets={'fake': (24, 1)}, recovery_seconds=600)
+        statuses = [call(limiter, server.url) for _ in range(40)]
+        server.shutdown()
+
+        state = limiter.state('fake')
+        assert state['throttled'] > 0
+        assert state['rate'] < 8
+        # Once the rate has come down, requests stop hitting the limit
+        assert statuses[-10:] == [200] * 10
+        # Another process opening the same file sees the reduced rate
+        assert RateLimiter(db_path, buckets={'fake': (24, 1)}).state('fake')['rate'] < 8
+
+def test_async_acquire_leaves_the_loop_running():
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = RateLimiter(os.path.join(tmp, "ratelimit.db"), buckets={'fake': (5, 1)})
+        ticks = []
+
+        async def ticker():
+            for _ in range(10):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        async def run():
+            tick_task = asyncio.create_task(ticker())
+            waits = [await limiter.acquire_async('fake') for _ in range(3)]
+            await tick_task
+            return waits
+
+        waits = asyncio.run(run())
+        # The second and third tokens take 0.2s each to refill
+        assert waits[0] == 0 and sum(waits) >= 0.35
+        # The ticker kept its pace while the acquires waited
+        assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.15
+
+if __name__ == "__main__":
+    test_processes_share_one_bucket()
+    test_429s_shrink_the_shared_rate()
+    test_async_acquire_leaves_the_loop_running()
+    print("All rate limit tests passed")
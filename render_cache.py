@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from series import load_manifest, save_manifest, discard_manifest, part_output_path, output_paths
+
+CACHE_DIR = "video_cache"
+# Oldest entries are evicted once the cached videos take more than this
+CACHE_MAX_BYTES = 5 * 1024**3
+
+def manifest_hash(manifest):
+    """SHA-256 of the canonical JSON form of a composition manifest"""
+    canonical = json.dumps(manifest, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def file_fingerprint(path):
+    """Identify an input file by name, size and modification time without reading it"""
+    stat = os.stat(path)
+    return {'name': os.path.basename(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.json")
+
+def _link_or_copy(source, destination):
+    """Hard link when both paths share a filesystem, otherwise copy"""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+def store(key, output_path, manifest, cache_dir=CACHE_DIR):
+    """Cache a finished render (single video or every part of a series) under its manifest hash"""
+    os.makedirs(cache_dir, exist_ok=True)
+    root = os.path.splitext(output_path)[0]
+    suffixes = []
+    for path in output_paths(output_path):
+        # abc.mp4 -> <key>.mp4, abc_part2.mp4 -> <key>_part2.mp4
+        suffix = path[len(root):]
+        _link_or_copy(path, os.path.join(cache_dir, key + suffix))
+        suffixes.append(suffix)
+
+    # The entry is written last, so a half-stored render is never a hit
+    entry_path = _entry_path(key, cache_dir)
+    with open(entry_path + ".tmp", 'w') as f:
+        json.dump({
+            'manifest': manifest,
+            'files': suffixes,
+            'series': load_manifest(output_path),
+            'stored_at': time.time()
+        }, f, indent=4)
+    os.replace(entry_path + ".tmp", entry_path)
+    prune(cache_dir)
+
+def restore(key, output_path, cache_dir=CACHE_DIR):
+    """Put a cached render at output_path; returns False on a miss"""
+    try:
+        with open(_entry_path(key, cache_dir), 'r') as f:
+            entry = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    sources = [os.path.join(cache_dir, key + suffix) for suffix in entry['files']]
+    if not all(os.path.exists(source) for source in sources):
+        return False
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    root = os.path.splitext(output_path)[0]
+    for source, suffix in zip(sources, entry['files']):
+        destination = root + suffix
+        _link_or_copy(source, destination)
+        # The pipeline only accepts freshly written videos
+        os.utime(destination)
+
+    series = entry['series']
+    if series is None:
+        discard_manifest(output_path)
+    else:
+        # A retried job keeps track of the parts it already uploaded
+        previous = load_manifest(output_path)
+        uploaded = set()
+        if previous and len(previous['parts']) == len(series['parts']):
+            uploaded = {part['part'] for part in previous['parts'] if part['uploaded']}
+        for part in series['parts']:
+            part['path'] = part_output_path(output_path, part['part'])
+            part['uploaded'] = part['part'] in uploaded
+        save_manifest(output_path, series)
+
+    # Mark the entry as recently used for eviction
+    os.utime(_entry_path(key, cache_dir))
+    return True
+
+def prune(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Evict the least recently used renders until the cache fits in max_bytes"""
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        entry_path = os.path.join(cache_dir, name)
+        try:
+            with open(entry_path, 'r') as f:
+                files = [os.path.join(cache_dir, name[:-5] + suffix) for suffix in json.load(f)['files']]
+            size = sum(os.path.getsize(path) for path in files if os.path.exists(path))
+            entries.append((os.path.getmtime(entry_path), entry_path, files, size))
+        except (OSError, ValueError, KeyError):
+            continue
+        total += size
+
+    for _, entry_path, files, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(entry_path)
+        for path in files:
+            if os.path.exists(path):
+                os.remove(path)
+        total -= size
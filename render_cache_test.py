@@ -0,0 +1,124 @@
+import os
+import tempfile
+import time
+
+import render_cache
+from series import write_manifest, load_manifest, mark_uploaded, part_output_path
+
+MANIFEST = {'post': "abc", 'composition_version': 2}
+
+def write_video(path, content=b"video"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+def test_single_video_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        output_path = os.path.join(tmp, "videos", "abc.mp4")
+        write_video(output_path, b"rendered")
+        render_cache.store("key1", output_path, MANIFEST, cache_dir=cache_dir)
+        os.remove(output_path)
+
+        assert not render_cache.restore("missing", output_path, cache_dir=cache_dir)
+        assert render_cache.restore("key1", output_path, cache_dir=cache_dir)
+        assert read(output_path) == b"rendered"
+        assert load_manifest(output_path) is None
+
+def test_restored_video_looks_freshly_written():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        output_path = os.path.join(tmp, "videos", "abc.mp4")
+        write_video(output_path)
+        age(output_path, 3600)
+        render_cache.store("key1", output_path, MANIFEST, cache_dir=cache_dir)
+        os.remove(output_path)
+
+        assert render_cache.restore("key1", output_path, cache_dir=cache_dir)
+        # check_video_exists only accepts videos written in the last 10 minutes
+        assert time.time() - os.path.getmtime(output_path) < 60
+
+def test_restore_drops_a_stale_series_manifest():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        output_path = os.path.join(tmp, "videos", "abc.mp4")
+        write_video(output_path)
+        render_cache.store("key1", output_path, MANIFEST, cache_dir=cache_dir)
+        write_manifest(output_path, "abc", "Title", [(part_output_path(output_path, 1), 10.0)])
+
+        assert render_cache.restore("key1", output_path, cache_dir=cache_dir)
+        assert load_manifest(output_path) is None
+
+def render_series(output_path):
+    parts = []
+    for number, duration in ((1, 100.0), (2, 90.0)):
+        path = part_output_path(output_path, number)
+        write_video(path, f"part {number}".encode())
+        parts.append((path, duration))
+    write_manifest(output_path, "abc", "Title", parts)
+
+def test_series_round_trip_keeps_uploaded_parts():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        output_path = os.path.join(tmp, "videos", "abc.mp4")
+        render_series(output_path)
+        render_cache.store("key1", output_path, MANIFEST, cache_dir=cache_dir)
+
+        # Part 1 went up before the job failed; the retry finds its videos gone
+        mark_uploaded(output_path, 1)
+        for number in (1, 2):
+            os.remove(part_output_path(output_path, number))
+
+        assert render_cache.restore("key1", output_path, cache_dir=cache_dir)
+        manifest = load_manifest(output_path)
+        assert [part['uploaded'] for part in manifest['parts']] == [True, False]
+        for part in manifest['parts']:
+            assert part['path'] == part_output_path(output_path, part['part'])
+            assert read(part['path']) == f"part {part['part']}".encode()
+
+        # Restored somewhere new, nothing has been uploaded yet
+        other_path = os.path.join(tmp, "other", "abc.mp4")
+        assert render_cache.restore("key1", other_path, cache_dir=cache_dir)
+        assert [part['uploaded'] for part in load_manifest(other_path)['parts']] == [False, False]
+
+def test_half_stored_entry_is_a_miss():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        output_path = os.path.join(tmp, "videos", "abc.mp4")
+        write_video(output_path)
+        render_cache.store("key1", output_path, MANIFEST, cache_dir=cache_dir)
+        os.remove(os.path.join(cache_dir, "key1.mp4"))
+        assert not render_cache.restore("key1", os.path.join(tmp, "retry", "abc.mp4"), cache_dir=cache_dir)
+
+def test_prune_evicts_least_recently_used_first():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        for i, key in enumerate(("key1", "key2", "key3")):
+            output_path = os.path.join(tmp, "videos", f"{key}.mp4")
+            write_video(output_path, b"x" * 100)
+            render_cache.store(key, output_path, MANIFEST, cache_dir=cache_dir)
+            age(os.path.join(cache_dir, f"{key}.json"), 300 - i * 100)
+
+        # A hit makes the oldest entry the most recently used
+        assert render_cache.restore("key1", os.path.join(tmp, "retry", "key1.mp4"), cache_dir=cache_dir)
+        render_cache.prune(cache_dir, max_bytes=250)
+        remaining = sorted(name for name in os.listdir(cache_dir) if name.endswith(".json"))
+        assert remaining == ["key1.json", "key3.json"]
+        assert not os.path.exists(os.path.join(cache_dir, "key2.mp4"))
+
+if __name__ == "__main__":
+    test_single_video_round_trip()
+    test_restored_video_looks_freshly_written()
+    test_restore_drops_a_stale_series_manifest()
+    test_series_round_trip_keeps_uploaded_parts()
+    test_half_stored_entry_is_a_miss()
+    test_prune_evicts_least_recently_used_first()
+    print("All render cache tests passed")
@@ -0,0 +1,121 @@
+import json
+import os
+
+# Longest a single part of a series may run, in seconds
+MAX_PART_SECONDS = 180
+
+def _greedy_parts(chunk_times, limit):
+    """Close a part whenever the next chunk would push it past limit seconds"""
+    parts = []
+    first = 0
+    for i, (_, end) in enumerate(chunk_times):
+        if i > first and end - chunk_times[first][0] > limit:
+            parts.append((first, i))
+            first = i
+    if chunk_times:
+        parts.append((first, len(chunk_times)))
+    return parts
+
+def plan_parts(chunk_times, max_duration=MAX_PART_SECONDS):
+    """
+    Group consecutive chunks into parts of at most max_duration seconds,
+    cutting only at chunk boundaries, and return (first, end) chunk index
+    ranges. Parts are balanced so the last one is not a few seconds long;
+    a single chunk longer than max_duration gets a part of its own.
+    """
+    parts = _greedy_parts(chunk_times, max_duration)
+    if len(parts) < 2:
+        return parts
+
+    # Find the smallest limit that still needs no more parts than the plain greedy split
+    total = chunk_times[-1][1] - chunk_times[0][0]
+    low, high = total / len(parts), max_duration
+    for _ in range(30):
+        middle = (low + high) / 2
+        if len(_greedy_parts(chunk_times, middle)) <= len(parts):
+            high = middle
+        else:
+            low = middle
+    return _greedy_parts(chunk_times, high)
+
+def part_output_path(output_path, part_number):
+    """videos/abc.mp4 -> videos/abc_part2.mp4"""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_part{part_number}{ext}"
+
+def manifest_path(output_path):
+    """Where the series manifest for a video output path lives"""
+    return os.path.splitext(output_path)[0] + ".series.json"
+
+def save_manifest(output_path, manifest):
+    """Replace the manifest atomically so an uploader never reads a half-written file"""
+    path = manifest_path(output_path)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(temp_path, path)
+
+def write_manifest(output_path, post_id, title, parts, previous=None):
+    """
+    Record the parts rendered for a post; parts is a list of (path, duration)
+    in order. previous is the manifest of an earlier render of the same output
+    (read from disk if not given): when it split the same post into the same
+    parts, their uploaded flags carry over so a retry does not post them again.
+    """
+    if previous is None:
+        previous = load_manifest(output_path)
+    parts = [(path, round(duration, 2)) for path, duration in parts]
+    uploaded = [False] * len(parts)
+    if previous and previous['post_id'] == post_id and \
+            [(part['path'], part['duration']) for part in previous['parts']] == parts:
+        uploaded = [part['uploaded'] for part in previous['parts']]
+    save_manifest(output_path, {
+        'post_id': post_id,
+        'title': title,
+        'parts': [
+            {'part': i + 1, 'path': path, 'duration': duration, 'uploaded': uploaded[i]}
+            for i, (path, duration) in enumerate(parts)
+        ]
+    })
+
+def load_manifest(output_path):
+    """The series manifest for an output path, or None if the render produced a single video"""
+    try:
+        with open(manifest_path(output_path), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def discard_manifest(output_path):
+    """Remove a stale manifest left by an earlier series render of the same output path"""
+    if os.path.exists(manifest_path(output_path)):
+        os.remove(manifest_path(output_path))
+
+def mark_uploaded(output_path, part_number):
+    """Remember an uploaded part so a retried upload job resumes after it"""
+    manifest = load_manifest(output_path)
+    manifest['parts'][part_number - 1]['uploaded'] = True
+    save_manifest(output_path, manifest)
+
+def series_caption(manifest, part_number, description):
+    """Caption for one part, naming the series and linking back to the original story"""
+    title = manifest['title']
+    if len(title) > 80:
+        title = title[:77] + "..."
+    total = len(manifest['parts'])
+    return (f"Part {part_number}/{total} of \"{title}\" - every part is on our profile, "
+            f"original story at redd.it/{manifest['post_id']} {description}")
+
+def output_paths(output_path):
+    """Every video file a render wrote: the parts of a series, or just the single video"""
+    manifest = load_manifest(output_path)
+    if manifest is None:
+        return [output_path]
+    return [part['path'] for part in manifest['parts']]
+
+def remove_outputs(output_path):
+    """Delete a render's videos and its manifest once they are uploaded"""
+    for path in output_paths(output_path):
+        if os.path.exists(path):
+            os.remove(path)
+    discard_manifest(output_path)
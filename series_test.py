@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+from series import (
+    plan_parts, part_output_path, write_manifest, load_manifest, mark_uploaded,
+    series_caption, output_paths, remove_outputs
+)
+
+def timeline(durations, gap=0.15):
+    """Chunk (start, end) times for chunks of the given narration lengths"""
+    times = []
+    start = 0.0
+    for duration in durations:
+        times.append((start, start + duration))
+        start += duration + gap
+    return times
+
+def test_short_story_is_one_part():
+    assert plan_parts(timeline([20, 30, 25]), max_duration=180) == [(0, 3)]
+
+def test_parts_cut_at_chunk_boundaries_and_stay_under_limit():
+    chunk_times = timeline([20] * 25)
+    parts = plan_parts(chunk_times, max_duration=180)
+    assert parts[0][0] == 0 and parts[-1][1] == 25
+    for (_, end), (first, _) in zip(parts, parts[1:]):
+        assert end == first
+    for first, end in parts:
+        assert chunk_times[end - 1][1] - chunk_times[first][0] <= 180
+
+def test_parts_are_balanced():
+    # A greedy split would leave a 20 second last part
+    parts = plan_parts(timeline([20] * 10), max_duration=180)
+    assert [end - first for first, end in parts] == [5, 5]
+
+def test_chunk_longer_than_limit_gets_its_own_part():
+    assert plan_parts(timeline([30, 200, 30]), max_duration=180) == [(0, 1), (1, 2), (2, 3)]
+
+def test_manifest_round_trip_and_cleanup():
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "abc.mp4")
+        assert output_paths(output_path) == [output_path]
+
+        paths = [part_output_path(output_path, k) for k in (1, 2)]
+        for path in paths:
+            open(path, 'w').close()
+        write_manifest(output_path, "abc", "My story", [(paths[0], 170.0), (paths[1], 160.0)])
+        assert output_paths(output_path) == paths
+
+        mark_uploaded(output_path, 1)
+        manifest = load_manifest(output_path)
+        assert [part['uploaded'] for part in manifest['parts']] == [True, False]
+        assert series_caption(manifest, 2, "#nosleep").startswith('Part 2/2 of "My story"')
+
+        remove_outputs(output_path)
+        assert os.listdir(tmp) == []
+
+def test_rerender_keeps_uploaded_flags_only_for_the_same_parts():
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "abc.mp4")
+        paths = [part_output_path(output_path, k) for k in (1, 2)]
+        parts = [(paths[0], 170.0), (paths[1], 160.0)]
+        write_manifest(output_path, "abc", "My story", parts)
+        mark_uploaded(output_path, 1)
+
+        # A retry renders the same parts again after removing the old outputs
+        previous = load_manifest(output_path)
+        remove_outputs(output_path)
+        write_manifest(output_path, "abc", "My story", parts, previous=previous)
+        assert [part['uploaded'] for part in load_manifest(output_path)['parts']] == [True, False]
+
+        # A different split means the posted part is not the one on disk any more
+        write_manifest(output_path, "abc", "My story", [(paths[0], 150.0), (paths[1], 180.0)])
+        assert [part['uploaded'] for part in load_manifest(output_path)['parts']] == [False, False]
@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = "spool.db"
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+# WAL keeps its index in shared memory, which only works between processes on
+# one host; nodes sharing the file over a network filesystem need the rollback journal
+JOURNAL_MODE = "DELETE"
+
+# stage -> (state it claims from, state while leased, state once complete)
+STAGES = {
+    'render': ('queued', 'rendering', 'rendered'),
+    'upload': ('rendered', 'uploading', 'done')
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    post_id TEXT UNIQUE NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    state TEXT NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at);
+"""
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class JobSpool:
+    """
+    A job queue in a SQLite file that any number of render and upload nodes
+    can share. Claims run inside BEGIN IMMEDIATE transactions, so only one
+    node can take a given job (SQLite's equivalent of SELECT ... FOR UPDATE
+    SKIP LOCKED). Every claim is a lease: workers renew it with heartbeats,
+    and jobs whose lease expired (the worker crashed) are requeued on the
+    next claim until they run out of attempts. Jobs are never deleted, so
+    the spool is also the shared record of which posts were ever taken on.
+    """
+    def __init__(self, path=SPOOL_PATH, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self.connect().executescript(SCHEMA)
+
+    def connect(self):
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        """Take the write lock up front so concurrent claimers serialize instead of deadlocking"""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def enqueue(self, post_id, payload, job_id=None):
+        """Add a job for a post unless one already exists; returns whether it was added"""
+        now = time.time()
+        cursor = self.connect().execute(
+            "INSERT OR IGNORE INTO jobs (id, post_id, payload, state, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id or uuid.uuid4().hex[:12], post_id, json.dumps(payload), now, now)
+        )
+        return cursor.rowcount == 1
+
+    def has_post(self, post_id):
+        row = self.connect().execute("SELECT 1 FROM jobs WHERE post_id = ?", (post_id,)).fetchone()
+        return row is not None
+
+    def _requeue_expired(self, conn, now):
+        """Give up on leases whose worker stopped heartbeating"""
+        for from_state, leased_state, _ in STAGES.values():
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', lease_owner = NULL, error = 'lease expired too often', updated_at = ? "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (now, leased_state, now, self.max_attempts)
+            )
+            conn.execute(
+                "UPDATE jobs SET state = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE state = ? AND lease_expires < ?",
+                (from_state, now, leased_state, now)
+            )
+
+    def claim(self, stage, worker_id):
+        """Lease the oldest job waiting for this stage, or return None"""
+        from_state, leased_state, _ = STAGES[stage]
+        now = time.time()
+        conn = self.transaction()
+        try:
+            self._requeue_expired(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state = ? ORDER BY created_at LIMIT 1",
+                (from_state,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ?",
+                (leased_state, worker_id, now + self.lease_seconds, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else {}
+        job['attempts'] += 1
+        return job
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend a lease; returns False if the worker no longer holds it"""
+        leased_states = [leased for _, leased, _ in STAGES.values()]
+        cursor = self.connect().execute(
+            f"UPDATE jobs SET lease_expires = ?, updated_at = ? "
+            f"WHERE id = ? AND lease_owner = ? AND state IN ({','.join('?' * len(leased_states))})",
+            (time.time() + self.lease_seconds, time.time(), job_id, worker_id, *leased_states)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, stage, result):
+        """Publish a stage's result and move the job on; returns False if the lease was lost"""
+        _, leased_state, done_state = STAGES[stage]
+        conn = self.transaction()
+        try:
+            row = conn.execute(
+                "SELECT result FROM jobs WHERE id = ? AND lease_owner = ? AND state = ?",
+                (job_id, worker_id, leased_state)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return False
+            # Results accumulate, so the upload stage sees what the render stage published
+            merged = json.loads(row['result']) if row['result'] else {}
+            merged.update(result)
+            conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, lease_owner = NULL, lease_expires = NULL, "
+                "attempts = 0, error = NULL, updated_at = ? WHERE id = ?",
+                (done_state, json.dumps(merged), time.time(), job_id)
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def fail(self, job_id, worker_id, stage, error):
+        """Release a job after a failed attempt, requeueing it unless it is out of attempts"""
+        from_state, leased_state, _ = STAGES[stage]
+        self.connect().execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE ? END, "
+            "lease_owner = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ? AND state = ?",
+            (self.max_attempts, from_state, str(error), time.time(), job_id, worker_id, leased_state)
+        )
+
+    def counts(self):
+        """Number of jobs in each state"""
+        rows = self.connect().execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {row['state']: row['n'] for row in rows}
+
+class LeaseHeartbeat(threading.Thread):
+    """Renews a job's lease in the background while its handler runs"""
+    def __init__(self, spool, job_id, worker_id):
+        super().__init__(daemon=True)
+        self.spool = spool
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = max(1.0, self.spool.lease_seconds / 3)
+        while not self._stop_event.wait(interval):
+            try:
+                if not self.spool.heartbeat(self.job_id, self.worker_id):
+                    logger.warning(f"Lost lease on job {self.job_id}")
+                    self.lost = True
+                    return
+            except sqlite3.Error as e:
+                logger.warning(f"Heartbeat for job {self.job_id} failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def run_spool_worker(spool, stage, handler, worker_id=None, poll_interval=5, stop_event=None, max_jobs=None,
+                     exit_when_idle=False):
+    """
+    Drain jobs for one stage. handler(job) returns a result dict on success,
+    or None / raises on failure. With exit_when_idle the worker returns as
+    soon as nothing is left to claim. Returns the number of jobs completed.
+    """
+    worker_id = worker_id or default_worker_id()
+    stop_event = stop_event or threading.Event()
+    completed = 0
+    while not stop_event.is_set() and (max_jobs is None or completed < max_jobs):
+        job = spool.claim(stage, worker_id)
+        if job is None:
+            if exit_when_idle:
+                break
+            stop_event.wait(poll_interval)
+            continue
+
+        logger.info(f"{worker_id} claimed {stage} job {job['id']} (attempt {job['attempts']})")
+        heartbeat = LeaseHeartbeat(spool, job['id'], worker_id)
+        heartbeat.start()
+        try:
+            result = handler(job)
+            error = None if result is not None else "handler reported failure"
+        except Exception as e:
+            result, error = None, e
+        finally:
+            heartbeat.stop()
+
+        if error is None:
+            if spool.complete(job['id'], worker_id, stage, result):
+                completed += 1
+            else:
+                logger.warning(f"{worker_id} finished job {job['id']} after losing its lease")
+        else:
+            logger.error(f"{stage} job {job['id']} failed: {error}")
+            spool.fail(job['id'], worker_id, stage, error)
+    return completed
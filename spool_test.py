@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from spool import JobSpool, run_spool_worker
+
+def record_handler(job, log_path):
+    """Pretend to render: note which post was handled and by whom"""
+    time.sleep(0.05)
+    with open(log_path, 'a') as f:
+        f.write(f"{job['post_id']} {os.getpid()}\n")
+    return {'output_path': f"videos/{job['post_id']}.mp4"}
+
+def render_worker_process(db_path, log_path):
+    spool = JobSpool(db_path, lease_seconds=5)
+    run_spool_worker(spool, 'render', lambda job: record_handler(job, log_path), exit_when_idle=True)
+
+def crashing_worker_process(db_path):
+    """Claim a job and die without releasing or heartbeating it"""
+    spool = JobSpool(db_path, lease_seconds=1)
+    spool.claim('render', 'doomed-worker')
+    os._exit(1)
+
+def test_each_job_is_rendered_exactly_once_by_several_processes():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "spool.db")
+        log_path = os.path.join(tmp, "handled.log")
+        spool = JobSpool(db_path)
+        for i in range(40):
+            assert spool.enqueue(f"post{i}", {'title': f"Story {i}"})
+        # Enqueueing the same post again is a no-op
+        assert not spool.enqueue("post0", {'title': "Story 0"})
+
+        workers = [
+            multiprocessing.Process(target=render_worker_process, args=(db_path, log_path))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=60)
+
+        with open(log_path) as f:
+            handled = [line.split() for line in f]
+        post_ids = [post_id for post_id, _ in handled]
+        assert sorted(post_ids) == sorted(f"post{i}" for i in range(40))
+        assert len({pid for _, pid in handled}) > 1
+        assert spool.counts() == {'rendered': 40}
+
+def test_expired_lease_is_requeued_after_worker_crash():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "spool.db")
+        spool = JobSpool(db_path, lease_seconds=1)
+        spool.enqueue("post1", {'title': "Story"})
+
+        crashed = multiprocessing.Process(target=crashing_worker_process, args=(db_path,))
+        crashed.start()
+        crashed.join()
+        assert spool.counts() == {'rendering': 1}
+
+        # Nothing to claim until the dead worker's lease runs out
+        assert spool.claim('render', 'survivor') is None
+        time.sleep(1.2)
+        job = spool.claim('render', 'survivor')
+        assert job['post_id'] == "post1"
+        assert job['attempts'] == 2
+        assert spool.complete(job['id'], 'survivor', 'render', {'output_path': "videos/post1.mp4"})
+
+        # The upload stage sees the result the render stage published
+        upload = spool.claim('upload', 'uploader')
+        assert upload['result'] == {'output_path': "videos/post1.mp4"}
+
+def test_heartbeat_keeps_lease_and_lost_lease_blocks_completion():
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = JobSpool(os.path.join(tmp, "spool.db"), lease_seconds=1)
+        spool.enqueue("post1", {'title': "Story"})
+        job = spool.claim('render', 'worker-a')
+
+        time.sleep(0.6)
+        assert spool.heartbeat(job['id'], 'worker-a')
+        time.sleep(0.6)
+        # Still leased thanks to the heartbeat
+        assert spool.claim('render', 'worker-b') is None
+
+        time.sleep(1.2)
+        stolen = spool.claim('render', 'worker-b')
+        assert stolen['id'] == job['id']
+        assert not spool.heartbeat(job['id'], 'worker-a')
+        assert not spool.complete(job['id'], 'worker-a', 'render', {})
+        assert spool.complete(job['id'], 'worker-b', 'render', {})
+
+def test_failed_attempts_end_in_failed_state():
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = JobSpool(os.path.join(tmp, "spool.db"), max_attempts=2)
+        spool.enqueue("post1", {'title': "Story"})
+        stop_event = threading.Event()
+        def failing_handler(job):
+            if job['attempts'] >= 2:
+                stop_event.set()
+            raise RuntimeError("render crashed")
+        run_spool_worker(spool, 'render', failing_handler, poll_interval=0.01, stop_event=stop_event)
+        assert spool.counts() == {'failed': 1}
+        row = spool.connect().execute("SELECT error FROM jobs").fetchone()
+        assert row['error'] == "render crashed"
+
+if __name__ == "__main__":
+    test_each_job_is_rendered_exactly_once_by_several_processes()
+    test_expired_lease_is_requeued_after_worker_crash()
+    test_heartbeat_keeps_lease_and_lost_lease_blocks_completion()
+    test_failed_attempts_end_in_failed_state()
+    print("All spool tests passed")
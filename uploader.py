@@ -1,26 +1,37 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.common.action_chains import ActionChains
 import os
 import time
 import pickle
 import logging
+import argparse
+import sys
+from metrics import Metrics
+from profiling import create_profiler, profiling_requested, sampling_requested
+from ratelimit import get_rate_limiter
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Selenium is imported inside the methods that drive the browser, so importing
+# this module (e.g. from a warm worker) does not pay for it up front.
+
 class TikTokUploader:
-    def __init__(self, cookies_file="tiktok_cookies.pkl"):
+    def __init__(self, cookies_file="tiktok_cookies.pkl", backend="selenium"):
+        """backend "selenium" drives Firefox through the upload page; "http" sends the file in resumable chunks"""
         self.cookies_file = cookies_file
+        self.backend = backend
         self.driver = None
+        self.metrics = Metrics()
+        self.metrics.profiler = create_profiler(
+            self.metrics.job_id,
+            enabled=profiling_requested(),
+            sample=sampling_requested()
+        )
         
     def setup_driver(self):
         """Initialize and configure Firefox driver"""
+        from selenium import webdriver
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.firefox.options import Options
+        
         firefox_options = Options()
         firefox_options.set_preference("dom.webdriver.enabled", False)
         firefox_options.set_preference('useAutomationExtension', False)
@@ -83,6 +94,10 @@ class TikTokUploader:
     
     def click_post_button(self):
         """Try multiple methods to click the specific Post button div"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.common.action_chains import ActionChains
+        
         try:
             # More specific selectors to target only the Post button
             selectors = [
@@ -176,6 +191,8 @@ class TikTokUploader:
         
     def check_upload_started(self):
         """Check if the upload has started"""
+        from selenium.webdriver.common.by import By
+        
         try:
             # Check for various indicators that the upload started
             indicators = [
@@ -191,6 +208,8 @@ class TikTokUploader:
         
     def wait_for_upload_completion(self):
         """Wait for upload to complete"""
+        from selenium.webdriver.common.by import By
+        
         try:
             start_time = time.time()
             while time.time() - start_time < 60:
@@ -209,51 +228,96 @@ class TikTokUploader:
             logger.error(f"Error waiting for upload completion: {e}")
             return False
 
+    def upload_video_http(self, video_path: str, description: str):
+        """Upload through the chunked HTTP client, using Selenium only for the saved session cookies"""
+        from http_uploader import HttpUploadClient, UploadError, load_cookie_header
+        
+        try:
+            if not os.path.exists(video_path):
+                logger.error(f"Video file not found: {video_path}")
+                return False
+            if not os.path.exists(self.cookies_file):
+                logger.error("No saved cookies found. Please run login first")
+                return False
+            
+            with self.metrics.span("upload_setup") as span:
+                span['rate_limit_wait'] = get_rate_limiter().acquire('uploader')
+                client = HttpUploadClient(load_cookie_header(self.cookies_file))
+            
+            with self.metrics.span("upload_file") as span:
+                publish_id = client.upload(video_path, description, span=span)
+            logger.info(f"Upload completed successfully! Publish id: {publish_id}")
+            return True
+        except (UploadError, OSError) as e:
+            logger.error(f"Upload failed: {e}")
+            return False
+        finally:
+            profile_summary = self.metrics.profiler.finish()
+            if profile_summary:
+                logger.info(f"Upload profiles written to {self.metrics.profiler.output_dir}{profile_summary}")
+    
     def upload_video(self, video_path: str, description: str, max_retries=3):
         """Upload video with retries and better timing"""
+        if self.backend == "http":
+            return self.upload_video_http(video_path, description)
+        
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        
         try:
             if not os.path.exists(video_path):
                 logger.error(f"Video file not found: {video_path}")
                 return False
                 
-            self.setup_driver()
+            with self.metrics.span("upload_setup") as span:
+                # Paced with every other uploader on this host before a browser is opened
+                span['rate_limit_wait'] = get_rate_limiter().acquire('uploader')
+                self.setup_driver()
             
             # Load cookies and go to upload page
-            self.driver.get("https://www.tiktok.com")
-            if self.load_cookies():
-                self.driver.get("https://www.tiktok.com/upload")
-                time.sleep(5)
-                
-                if "/login" in self.driver.current_url:
-                    logger.error("Cookies expired. Please login again.")
-                    os.remove(self.cookies_file)
+            with self.metrics.span("upload_login") as span:
+                self.driver.get("https://www.tiktok.com")
+                if self.load_cookies():
+                    self.driver.get("https://www.tiktok.com/upload")
+                    time.sleep(5)
+                    
+                    if "/login" in self.driver.current_url:
+                        logger.error("Cookies expired. Please login again.")
+                        os.remove(self.cookies_file)
+                        span['status'] = 'failed'
+                        return False
+                else:
+                    logger.error("No saved cookies found. Please run login first")
+                    span['status'] = 'failed'
                     return False
-            else:
-                logger.error("No saved cookies found. Please run login first")
-                return False
             
             # Upload video file
-            file_input = self.wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file']"))
-            )
-            file_input.send_keys(os.path.abspath(video_path))
+            with self.metrics.span("upload_file") as span:
+                file_input = self.wait.until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file']"))
+                )
+                file_input.send_keys(os.path.abspath(video_path))
+                span['bytes'] = os.path.getsize(video_path)
             logger.info("Video file uploaded, waiting for processing...")
             
             # Initial wait for video to start processing
-            time.sleep(15)
+            with self.metrics.span("upload_initial_wait"):
+                time.sleep(15)
             logger.info("Initial processing wait complete...")
             
             # Add description
-            caption_input = self.wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div[contenteditable='true']"))
-            )
-            caption_input.clear()
-            caption_input.send_keys(description)
+            with self.metrics.span("upload_caption"):
+                caption_input = self.wait.until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "div[contenteditable='true']"))
+                )
+                caption_input.clear()
+                caption_input.send_keys(description)
             logger.info("Caption added")
             
             # Long wait for video processing to complete
             logger.info("Waiting 60 seconds for video processing to complete...")
-            time.sleep(60)  # Wait full minute for processing
+            with self.metrics.span("upload_processing_wait"):
+                time.sleep(60)  # Wait full minute for processing
             logger.info("60-second wait completed")
             
             # Scroll to ensure post button is visible
@@ -261,15 +325,18 @@ class TikTokUploader:
             time.sleep(2)
             
             # Try to click post with retries
-            for attempt in range(max_retries):
-                logger.info(f"Attempting to click post div (attempt {attempt + 1}/{max_retries})")
-                if self.click_post_button():
-                    logger.info("Waiting for upload to complete...")
-                    if self.wait_for_upload_completion():
-                        logger.info("Upload completed successfully!")
-                        return True
-                    
-                time.sleep(5)
+            with self.metrics.span("upload_post") as span:
+                for attempt in range(max_retries):
+                    span['retries'] = attempt
+                    logger.info(f"Attempting to click post div (attempt {attempt + 1}/{max_retries})")
+                    if self.click_post_button():
+                        logger.info("Waiting for upload to complete...")
+                        if self.wait_for_upload_completion():
+                            logger.info("Upload completed successfully!")
+                            return True
+                        
+                    time.sleep(5)
+                span['status'] = 'failed'
             
             logger.error("Failed to post automatically after all retries")
             # Take a screenshot for debugging
@@ -284,29 +351,44 @@ class TikTokUploader:
             if self.driver:
                 time.sleep(3)
                 self.driver.quit()
+            profile_summary = self.metrics.profiler.finish()
+            if profile_summary:
+                logger.info(f"Upload profiles written to {self.metrics.profiler.output_dir}{profile_summary}")
+
+DEFAULT_DESCRIPTION = "Check out this Reddit story! #reddit #storytelling #nosleep #scary #story"
 
 def main():
-    uploader = TikTokUploader()
+    # Set up logging here rather than at import, so the pipeline importing this module keeps its own handlers
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Upload a video to TikTok")
+    parser.add_argument("--video", default="output_video.mp4", help="Video file to upload")
+    parser.add_argument("--description", default=DEFAULT_DESCRIPTION, help="Caption for the video")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium",
+                        help="Drive the upload page in Firefox, or send the file in resumable HTTP chunks")
+    args = parser.parse_args()
+    
+    uploader = TikTokUploader(backend=args.backend)
     
     # If first time or cookies expired, do login
     if not os.path.exists("tiktok_cookies.pkl"):
         logger.info("First time setup - starting login process...")
         if not uploader.login():
             logger.error("Login failed. Please try again.")
-            return
+            sys.exit(1)
     
     # Upload video
-    video_path = "output_video.mp4"
-    description = "Check out this Reddit story! #reddit #storytelling #nosleep #scary #story"
-    
-    success = uploader.upload_video(video_path, description)
-    if not success:
+    success = uploader.upload_video(args.video, args.description)
+    # Only offer an interactive re-login when someone is at the terminal (not under the pipeline)
+    if not success and sys.stdin.isatty():
         logger.info("Would you like to try logging in again? (y/n)")
         if input().lower() == 'y':
             if os.path.exists("tiktok_cookies.pkl"):
                 os.remove("tiktok_cookies.pkl")
             uploader.login()
-            uploader.upload_video(video_path, description)
+            success = uploader.upload_video(args.video, args.description)
+    
+    if not success:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WORKER_SOCKET_PATH = "/tmp/reddit-tiktok-worker.sock"
+# Extra seconds a client waits beyond a job's timeout, for the worker to answer that it gave up
+RESPONSE_GRACE_SECONDS = 60
+
+def descendant_pids(pid=None):
+    """Every process started below pid (ffmpeg, the browser, render pools), read from /proc"""
+    pending, found = [pid or os.getpid()], []
+    while pending:
+        parent = pending.pop()
+        try:
+            tasks = os.listdir(f"/proc/{parent}/task")
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open(f"/proc/{parent}/task/{task}/children") as f:
+                    children = [int(child) for child in f.read().split()]
+            except OSError:
+                continue
+            found += children
+            pending += children
+    return found
+
+def kill_descendants():
+    for pid in reversed(descendant_pids()):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+class RenderWorker:
+    """
+    Long-running video generator. It imports the heavy modules once and keeps
+    the card browser and Reddit client warm, then takes jobs one at a time as
+    JSON lines over a local Unix socket. Jobs and the browser live on their
+    own event loop thread, so the blocking MoviePy and ffmpeg work of a render
+    never stalls the socket loop and a busy worker still answers pings.
+    """
+    def __init__(self, socket_path=WORKER_SOCKET_PATH):
+        self.socket_path = socket_path
+        self.renderer = None
+        self.warm_up_seconds = None
+        self.lock = asyncio.Lock()
+        self.restart_requested = False
+        self.job_loop = asyncio.new_event_loop()
+        self.job_thread = threading.Thread(target=self.job_loop.run_forever, name="render-jobs", daemon=True)
+
+    def run_job(self, coro):
+        """Run a coroutine on the job loop and return an awaitable for its result"""
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.job_loop))
+
+    async def start_renderer(self):
+        """Load every heavy dependency and start the shared browser (runs on the job loop)"""
+        import main
+        start = time.perf_counter()
+        main.warm_up()
+        main.get_reddit_client()
+        self.renderer = await main.CardRenderer().start()
+        self.warm_up_seconds = time.perf_counter() - start
+
+    async def warm_up(self):
+        self.job_thread.start()
+        await self.run_job(self.start_renderer())
+        logger.info(f"Worker warmed up in {self.warm_up_seconds:.2f} seconds")
+
+    async def ensure_renderer(self):
+        """Restart the shared browser if it crashed since the last job"""
+        import main
+        if self.renderer.browser is None or not self.renderer.browser.is_connected():
+            logger.warning("Card browser disconnected, restarting it")
+            await self.renderer.close()
+            self.renderer = await main.CardRenderer().start()
+
+    async def handle_request(self, request):
+        import main
+        command = request.get('command')
+
+        if command == 'ping':
+            return {'ok': True, 'warm_up_seconds': self.warm_up_seconds}
+
+        if command == 'warm_up':
+            # Lets callers measure what job startup costs in an already warm process
+            start = time.perf_counter()
+            await asyncio.get_running_loop().run_in_executor(None, main.warm_up)
+            return {'ok': True, 'seconds': time.perf_counter() - start}
+
+        if command == 'create_video':
+            # The timeout covers waiting for the lock as well, matching the client's deadline
+            start = time.perf_counter()
+            timeout = request.get('timeout')
+            try:
+                await asyncio.wait_for(self.lock.acquire(), timeout)
+            except asyncio.TimeoutError:
+                return {'ok': False, 'error': "Worker busy with another job", 'seconds': time.perf_counter() - start}
+            try:
+                remaining = None if timeout is None else max(0, timeout - (time.perf_counter() - start))
+                try:
+                    await self.run_job(self.ensure_renderer())
+                    await asyncio.wait_for(self.run_job(main.create_video(
+                        draft=request.get('draft', False),
+                        profile=request.get('profile', False),
+                        profile_sample=request.get('profile_sample', False),
+                        job_id=request.get('job_id'),
+                        renderer=self.renderer,
+                        post_id=request.get('post_id'),
+                        output_path=request.get('output_path'),
+                        series=request.get('series', False),
+                        max_part_seconds=request.get('max_part_seconds', main.MAX_PART_SECONDS),
+                        outputs=request.get('outputs'),
+                        mode=request.get('mode', "story"),
+                        subreddit=request.get('subreddit')
+                    )), remaining)
+                    return {'ok': True, 'seconds': time.perf_counter() - start}
+                except asyncio.TimeoutError:
+                    # The job thread is stuck in blocking code that cannot be cancelled, so the
+                    # whole worker is replaced once this answer is sent
+                    logger.error(f"Job timed out after {timeout} seconds, restarting the worker")
+                    self.restart_requested = True
+                    return {'ok': False, 'timed_out': True, 'error': f"Timed out after {timeout} seconds",
+                            'seconds': time.perf_counter() - start}
+                except Exception as e:
+                    logger.error(f"Job failed: {e}")
+                    return {'ok': False, 'error': str(e), 'seconds': time.perf_counter() - start}
+            finally:
+                # A worker about to restart takes no further jobs
+                if not self.restart_requested:
+                    self.lock.release()
+
+        return {'ok': False, 'error': f"Unknown command: {command}"}
+
+    async def handle_client(self, reader, writer):
+        try:
+            line = await reader.readline()
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = {'ok': False, 'error': f"Invalid request: {e}"}
+            else:
+                response = await self.handle_request(request)
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+        finally:
+            writer.close()
+        if self.restart_requested:
+            self.restart()
+
+    def restart(self):
+        """Kill everything a hung job started and replace this process with a fresh worker"""
+        kill_descendants()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        logging.shutdown()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    async def serve(self):
+        await self.warm_up()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        # Only this user may submit jobs: the umask covers the moment between bind and chmod
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Worker listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.run_job(self.renderer.close())
+            self.job_loop.call_soon_threadsafe(self.job_loop.stop)
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+def submit_job(request, socket_path=WORKER_SOCKET_PATH, timeout=None):
+    """Send one request to a running worker and return its JSON response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + "\n").encode())
+        response = b""
+        while not response.endswith(b"\n"):
+            data = sock.recv(65536)
+            if not data:
+                break
+            response += data
+    return json.loads(response)
+
+def worker_available(socket_path=WORKER_SOCKET_PATH):
+    """Check whether a warm worker is listening on the socket"""
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        return submit_job({'command': 'ping'}, socket_path, timeout=5).get('ok', False)
+    except (OSError, ValueError):
+        return False
+
+if __name__ == "__main__":
+    # Set up logging here rather than at import, so the pipeline importing this module keeps its own handlers
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Warm video generator worker listening on a Unix socket")
+    parser.add_argument("--socket", default=WORKER_SOCKET_PATH, help="Path of the Unix socket to listen on")
+    args = parser.parse_args()
+    try:
+        asyncio.run(RenderWorker(args.socket).serve())
+    except KeyboardInterrupt:
+        logger.info("Worker stopped by user")